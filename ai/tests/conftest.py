@@ -0,0 +1,10 @@
+import os
+import sys
+
+# ワーカーのモジュールは workers 直下からの import を前提としている
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workers"
+    ),
+)
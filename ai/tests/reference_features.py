@@ -0,0 +1,81 @@
+"""
+features.py に置き換える前のワーカーの特徴量算出（workers/main.py の pre_processing）
+新しい実装が同じ特徴量を返すことを確認するためにテストでのみ使う
+"""
+
+import holidays
+import numpy as np
+import pandas as pd
+
+
+# 特徴量の追加
+def pre_processing(ohlcv):
+    df = pd.DataFrame(ohlcv)
+    df.columns = ["timestamp", "open", "high", "low", "close", "volume"]
+
+    # datetime列を追加（timestampから算出）
+    df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
+
+    # datetime列をindexとし、1h毎のデータにする
+    df_resample = df.set_index("datetime").resample("1h").asfreq()
+
+    # timestamp全体をdatetimeから算出しセットしなおす
+    df_resample["timestamp"] = df_resample.index.map(
+        lambda x: int(x.timestamp() * 1000)
+    )
+
+    # volumeが低すぎるデータは異常値としてNaNにする
+    min_vol = 10
+    df_resample.loc[df_resample["volume"] <= min_vol, "volume"] = np.nan
+
+    # 欠損を含む行の確認
+    df_resample[df_resample.isnull().any(axis=1)]
+    df_feat1 = df_resample.copy()
+
+    # day列を追加
+    day_names = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+    df_feat1["day"] = df_feat1.index.dayofweek.map(lambda x: day_names[x])
+
+    # dayをダミー変数化
+    day = pd.get_dummies(df_feat1["day"], drop_first=False, dtype=int)
+    df_feat1 = pd.concat([df_feat1, day], axis=1).drop("day", axis=1)
+
+    # 足りない列（sat, sunなど）を 0 で埋めて強制的に作成する
+    for col in day_names:
+        if col not in df_feat1.columns:
+            df_feat1[col] = 0
+
+    # dfに存在する"年"のリストを作成する
+    years = df_feat1.index.year.unique().tolist()
+
+    # アメリカの祝日を取得
+    us_holidays = holidays.UnitedStates(years=years)
+
+    # 特徴量の追加　祝日 (1: 祝日, 0: 平日)
+    df_feat1["is_holiday"] = df_feat1.index.map(lambda x: 1 if x in us_holidays else 0)
+
+    df_feat1["is_off_day"] = (
+        df_feat1[["sat", "sun", "is_holiday"]].any(axis=1).astype(int)
+    )
+
+    df_feat2 = df_feat1.copy()
+
+    # ｎ時間前からのリターン（対数収益率）
+    for n in [1, 2, 4, 12, 24]:
+        df_feat2[f"log_ret_{n}h"] = np.log(
+            df_feat2["close"] / df_feat2["close"].shift(n)
+        )
+
+    # ｎ時間のボラティリティ
+    for n in [4, 24]:
+        df_feat2[f"vola_{n}h"] = df_feat2["log_ret_1h"].rolling(n).std()
+
+    # 出来高比率
+    vol_mean24 = df_feat2["volume"].rolling(24).mean()
+    df_feat2["vol_ratio_24h"] = (df_feat2["volume"] - vol_mean24) / vol_mean24
+
+    # 24h移動平均との乖離
+    sma_24 = df_feat2["close"].rolling(24).mean()
+    df_feat2["bias_24h"] = (df_feat2["close"] - sma_24) / sma_24
+
+    return df_feat2
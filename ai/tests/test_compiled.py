@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from compiled import TREES, CompiledModel, compile_estimator, predict_trees
+from features import FEATURE_COLS, build_features
+from model_registry import scale_features
+from test_features import random_ohlcv
+
+joblib = pytest.importorskip("joblib")
+pytest.importorskip("sklearn")
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models")
+TREE_MODELS = ["decision_tree", "random_forest", "random_forest_2025"]
+
+# models/*.pkl は学習時と異なるバージョンの sklearn で読み込むことがある
+pytestmark = pytest.mark.filterwarnings("ignore::UserWarning")
+
+
+def load(name, tmp_path):
+    """pkl と、それを export した .npz（保存・読み込みも通す）"""
+    estimator = joblib.load(os.path.join(MODEL_DIR, f"{name}.pkl"))
+    path = tmp_path / f"{name}.npz"
+    np.savez_compressed(path, **compile_estimator(estimator))
+    return estimator, CompiledModel.load(path)
+
+
+def random_rows(seed):
+    """実際の足から算出した特徴量（先頭の欠損行は除く）"""
+    X = build_features(random_ohlcv(seed))[FEATURE_COLS]
+    return X[X.notna().all(axis=1)].reset_index(drop=True)
+
+
+def threshold_rows(estimator, base, seed):
+    """
+    分岐のしきい値ちょうどの値を持つ行
+    float64 のしきい値そのものと、float32 に丸めた値・その前後の値を使う
+    """
+    rng = np.random.default_rng(seed)
+    trees = getattr(estimator, "estimators_", [estimator])
+    rows = []
+    for tree in trees[:20]:
+        t = tree.tree_
+        for node in np.flatnonzero(t.children_left != -1):
+            f, threshold = t.feature[node], t.threshold[node]
+            t32 = np.float32(threshold)
+            for value in (
+                threshold,
+                t32,
+                np.nextafter(t32, np.float32(-np.inf)),
+                np.nextafter(t32, np.float32(np.inf)),
+            ):
+                row = base.iloc[rng.integers(len(base))].to_numpy().copy()
+                row[f] = value
+                rows.append(row)
+    return pd.DataFrame(rows, columns=base.columns)
+
+
+def nan_rows(base, seed):
+    """ランダムな列を欠損させた行（欠損のない列は実際の値）"""
+    rng = np.random.default_rng(seed)
+    X = base.sample(500, replace=True, random_state=seed).to_numpy().copy()
+    X[rng.random(X.shape) < 0.3] = np.nan
+    return pd.DataFrame(X, columns=base.columns)
+
+
+@pytest.mark.parametrize("name", TREE_MODELS)
+def test_tree_models_match_sklearn(tmp_path, name):
+    estimator, compiled = load(name, tmp_path)
+    assert compiled.kind == TREES
+
+    base = random_rows(0)
+    for X in (base, threshold_rows(estimator, base, 1), nan_rows(base, 2)):
+        expected = estimator.predict(X[FEATURE_COLS])
+        assert (compiled.predict(X) == expected).all()
+
+
+def test_tree_models_match_sklearn_in_one_pass(tmp_path):
+    loaded = [load(name, tmp_path) for name in TREE_MODELS]
+    X = pd.concat([random_rows(3), nan_rows(random_rows(3), 4)])
+
+    ys = predict_trees([compiled for _, compiled in loaded], X)
+
+    for (estimator, _), y in zip(loaded, ys):
+        assert (y == estimator.predict(X[FEATURE_COLS])).all()
+
+
+def test_logistic_regression_with_scaler_matches_sklearn(tmp_path):
+    estimator, compiled = load("logistic_regression", tmp_path)
+    scaler, compiled_scaler = load("logistic_regression_sc", tmp_path)
+
+    X = random_rows(5)
+    # しきい値の代わりに、上位2クラスのスコアがほぼ等しくなる行も含める
+    rng = np.random.default_rng(6)
+    scaled = scale_features(scaler, X, FEATURE_COLS)[estimator.feature_names_in_]
+    Z = scaled.to_numpy()
+    scores = estimator.decision_function(scaled)
+    top2 = np.argsort(scores, axis=1)[:, -2:]
+    rows = np.arange(len(Z))
+    w = estimator.coef_[top2[:, 1]] - estimator.coef_[top2[:, 0]]
+    gap = scores[rows, top2[:, 1]] - scores[rows, top2[:, 0]]
+    Z = Z - (gap / (w * w).sum(axis=1))[:, None] * w
+    Z += rng.normal(0, 1e-9, Z.shape)
+    near = pd.DataFrame(Z * scaler.scale_ + scaler.mean_, columns=scaled.columns)
+    X = pd.concat([X, near[X.columns]], ignore_index=True)
+
+    expected = estimator.predict(scale_features(scaler, X, FEATURE_COLS))
+    actual = compiled.predict(scale_features(compiled_scaler, X, FEATURE_COLS))
+    assert (actual == expected).all()
+
+    # 欠損値はどちらも受け付けない
+    X_nan = nan_rows(random_rows(5), 7)
+    with pytest.raises(ValueError):
+        estimator.predict(scale_features(scaler, X_nan, FEATURE_COLS))
+    with pytest.raises(ValueError):
+        compiled.predict(scale_features(compiled_scaler, X_nan, FEATURE_COLS))
@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+from features import FEATURE_COLS, HOUR_MS, CandleRing, build_features
+from reference_features import pre_processing
+
+
+def random_ohlcv(
+    seed, hours=24 * 60, start=datetime(2024, 12, 10, tzinfo=timezone.utc)
+):
+    """
+    ランダムウォークの1時間足（年末年始・祝日を含む期間）
+    欠けている時間帯と、volumeが異常値扱いになる時間帯を混ぜる
+    """
+    rng = np.random.default_rng(seed)
+    start_ms = int(start.timestamp() * 1000)
+
+    close = 60000 * np.exp(np.cumsum(rng.normal(0, 0.005, hours)))
+    open_ = np.concatenate([[60000], close[:-1]])
+    volume = rng.uniform(0, 500, hours)
+    volume[rng.random(hours) < 0.05] = rng.uniform(0, 10)
+
+    ohlcv = [
+        [
+            start_ms + i * HOUR_MS,
+            open_[i],
+            max(open_[i], close[i]) * 1.001,
+            min(open_[i], close[i]) * 0.999,
+            close[i],
+            volume[i],
+        ]
+        for i in range(hours)
+    ]
+
+    # 先頭・末尾は残して、ところどころの足を欠けさせる
+    keep = rng.random(hours) >= 0.03
+    keep[[0, -1]] = True
+    return [candle for candle, k in zip(ohlcv, keep) if k]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_build_features_matches_pre_processing(seed):
+    ohlcv = random_ohlcv(seed)
+
+    expected = pre_processing(ohlcv)
+    actual = build_features(ohlcv)
+
+    assert list(actual.index) == list(expected.index)
+    assert np.allclose(
+        actual[FEATURE_COLS].to_numpy(dtype=float),
+        expected[FEATURE_COLS].to_numpy(dtype=float),
+        equal_nan=True,
+    )
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_candle_ring_matches_last_row_of_build_features(seed):
+    ohlcv = random_ohlcv(seed, hours=24 * 20)
+
+    # ワーカーと同じく、予測対象の足までの30時間分から1行を算出する
+    for end in range(30, len(ohlcv), 7):
+        window = ohlcv[end - 30 : end + 1]
+        timestamp = window[-1][0]
+
+        ring = CandleRing()
+        ring.extend(window)
+        row = ring.feature_row(timestamp)
+
+        expected = build_features(window).iloc[[-1]]
+        assert row.index[0] == expected.index[0]
+        assert np.allclose(
+            row[FEATURE_COLS].to_numpy(dtype=float),
+            expected[FEATURE_COLS].to_numpy(dtype=float),
+            equal_nan=True,
+        )
+
+
+def test_candle_ring_rejects_missing_target():
+    ohlcv = random_ohlcv(0, hours=48)
+
+    ring = CandleRing()
+    ring.extend(ohlcv)
+
+    with pytest.raises(ValueError):
+        ring.feature_row(ohlcv[-1][0] + HOUR_MS)
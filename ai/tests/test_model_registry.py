@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from compiled import SCALER, CompiledModel
+from features import FEATURE_COLS
+from model_registry import scale_features
+
+
+def compiled_scaler(feature_names, mean):
+    return CompiledModel(
+        {
+            "kind": np.array(SCALER),
+            "mean": np.asarray(mean, dtype=np.float64),
+            "scale": np.ones(len(mean)),
+            "feature_names": np.array(feature_names, dtype=str),
+        }
+    )
+
+
+def test_scale_features_labels_columns_in_scaler_order():
+    # 学習時の列順が FEATURE_COLS と異なるスケーラー
+    names = FEATURE_COLS[::-1]
+    mean = np.arange(len(names), dtype=np.float64) * 10
+    scaler = compiled_scaler(names, mean)
+
+    X = pd.DataFrame(
+        [np.arange(len(FEATURE_COLS), dtype=np.float64)], columns=FEATURE_COLS
+    )
+    scaled = scale_features(scaler, X, FEATURE_COLS)
+
+    for name, m in zip(names, mean):
+        assert scaled[name].iloc[0] == X[name].iloc[0] - m
+
+
+def test_scale_features_without_feature_names_uses_feature_cols():
+    mean = np.arange(len(FEATURE_COLS), dtype=np.float64)
+    scaler = compiled_scaler([], mean)
+
+    # 列順が違っても feature_cols の順で渡す
+    X = pd.DataFrame([np.ones(len(FEATURE_COLS))], columns=FEATURE_COLS[::-1])
+    scaled = scale_features(scaler, X, FEATURE_COLS)
+
+    assert list(scaled.columns) == FEATURE_COLS
+    assert np.allclose(scaled.iloc[0].to_numpy(), 1 - mean)
+
+
+def test_scale_features_with_sklearn_scaler():
+    preprocessing = pytest.importorskip("sklearn.preprocessing")
+
+    rng = np.random.default_rng(0)
+    names = FEATURE_COLS[::-1]
+    train = pd.DataFrame(rng.normal(size=(50, len(names))), columns=names)
+    scaler = preprocessing.StandardScaler().fit(train)
+
+    X = pd.DataFrame(rng.normal(size=(3, len(FEATURE_COLS))), columns=FEATURE_COLS)
+    scaled = scale_features(scaler, X, FEATURE_COLS)
+
+    for name in FEATURE_COLS:
+        i = names.index(name)
+        expected = (X[name] - scaler.mean_[i]) / scaler.scale_[i]
+        assert np.allclose(scaled[name], expected)
@@ -0,0 +1,262 @@
+"""
+過去の1時間足でAIモデルの成績をゲームのルール通りにシミュレーションする
+
+    python workers/backtest.py --since 2024-01-01 [--csv ohlcv.csv] [--out curves.csv]
+
+- 毎正時にラウンドが開始し、基準価格は開始時刻の足の open
+- 判定価格は開始3時間後の足の close（backend の /game_rounds/settle と同じ）
+- ±0.3% で BEARISH(1) / NEUTRAL(2) / BULLISH(3) を判定し、
+  参加者数 × 100pt × 2 のプールを勝者で等分する（backend/settlement.py と同じ）
+- 参加者はバックテスト対象のモデルのみ（人間の参加者は含めない）
+- 参加時に 100pt を支払い、配当は判定に使う足の確定後に受け取る
+  ポイントが 100pt 未満のモデルはそのラウンドに参加できない
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from compiled import TREES, CompiledModel, predict_trees
+from features import FEATURE_COLS, HOUR_MS, build_features
+from model_registry import ModelRegistry, scale_features
+
+# backend/settlement.py と同じ値
+STAKE = 100
+BONUS = 2
+THRESHOLD = 0.003
+INITIAL_POINTS = 1000
+
+# 判定に使う足（開始時刻から何本後の close か）
+RESULT_OFFSET = 3
+# 配当を受け取れるラウンド（判定に使う足が確定した時刻に開始するラウンド）
+SETTLE_OFFSET = RESULT_OFFSET + 1
+
+
+def fetch_history(since, symbol="BTC/USDT", timeframe="1h"):
+    """取引所から since(ms) 以降の1時間足を全て取得する"""
+    import ccxt
+
+    exchange = ccxt.binance({"enableRateLimit": True})
+    ohlcv = []
+    while True:
+        page = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=1000)
+        if not page:
+            break
+        ohlcv.extend(page)
+        since = page[-1][0] + HOUR_MS
+        if len(page) < 1000:
+            break
+    return ohlcv
+
+
+def live_features(df):
+    """
+    ワーカーが開始時刻直後に算出する特徴量を全行まとめて再現する
+    開始時刻の足は始まったばかりなので close = open、出来高は閾値以下（NaN）として扱う
+    それ以前の足は確定済みの値を使う
+    """
+    feats = df[FEATURE_COLS].copy()
+    open_ = df["open"].to_numpy()
+    close = df["close"].to_numpy()
+
+    def prev(values, n):
+        shifted = np.full_like(values, np.nan)
+        shifted[n:] = values[:-n]
+        return shifted
+
+    for n in [1, 2, 4, 12, 24]:
+        feats[f"log_ret_{n}h"] = np.log(open_ / prev(close, n))
+
+    # 直前 n-1 本の確定済みリターン + 開始時刻の足のリターン
+    log_ret_1h = df["log_ret_1h"].to_numpy()
+    live_ret = feats["log_ret_1h"].to_numpy()
+    for n in [4, 24]:
+        window = np.full((len(df), n), np.nan)
+        window[n - 1 :, :-1] = sliding_window_view(log_ret_1h, n - 1)[:-1]
+        window[:, -1] = live_ret
+        feats[f"vola_{n}h"] = np.std(window, axis=1, ddof=1)
+
+    feats["vol_ratio_24h"] = np.nan
+
+    window = np.full((len(df), 24), np.nan)
+    window[23:, :-1] = sliding_window_view(close, 23)[:-1]
+    window[:, -1] = open_
+    sma_24 = window.mean(axis=1)
+    feats["bias_24h"] = (open_ - sma_24) / sma_24
+
+    return feats
+
+
+def winning_choices(df):
+    """各時刻に開始したラウンドの正解（判定できないラウンドは0）"""
+    base = df["open"].to_numpy()
+    result = np.full(len(df), np.nan)
+    result[:-RESULT_OFFSET] = df["close"].to_numpy()[RESULT_OFFSET:]
+
+    diff_pct = (result - base) / base
+    choice = np.where(diff_pct <= -THRESHOLD, 1, np.where(diff_pct >= THRESHOLD, 3, 2))
+    return np.where(np.isnan(diff_pct), 0, choice)
+
+
+def predict_batch(registry, ai_users, X):
+    """
+    全モデルで全行を予測する。戻り値は (モデル数, 行数) の配列（予測できない行は0）
+    木系の .npz モデルは1回の走査でまとめて評価する
+    """
+    preds = np.zeros((len(ai_users), len(X)), dtype=np.int64)
+    has_nan = X.isna().any(axis=1).to_numpy()
+
+    trees = []
+    for i, ai in enumerate(ai_users):
+        model = registry.get(ai["file"])
+        if isinstance(model, CompiledModel) and model.kind == TREES:
+            trees.append(i)
+            continue
+
+        # 木以外のモデルは欠損値を扱えないため、その行は不参加とする
+        rows = X[~has_nan]
+        if rows.empty:
+            continue
+        if ai.get("scaler_file"):
+            scaler = registry.get(ai["scaler_file"])
+            rows = scale_features(scaler, rows, FEATURE_COLS)
+        preds[i, ~has_nan] = model.predict(rows[FEATURE_COLS])
+
+    if trees:
+        models = [registry.get(ai_users[i]["file"]) for i in trees]
+        for i, y in zip(trees, predict_trees(models, X)):
+            preds[i] = y
+
+    return preds
+
+
+def simulate(preds, winning):
+    """
+    ラウンドを順に進めて勝敗・ポイント増減を計算する
+    各ラウンドの開始時点でポイントが STAKE 未満のモデルは参加しない
+    戻り値は (モデル数, ラウンド数) の勝敗フラグ・ポイント増減
+    （ポイント増減は支払い・配当を受け取ったラウンドに計上する）
+    """
+    n_models, n_rounds = preds.shape
+    entered = (preds > 0) & (winning > 0)
+    correct = entered & (preds == winning)
+
+    playing = np.zeros((n_models, n_rounds), dtype=bool)
+    net = np.zeros((n_models, n_rounds), dtype=np.int64)
+    balance = np.full(n_models, INITIAL_POINTS, dtype=np.int64)
+
+    for t in range(n_rounds):
+        # 判定済みのラウンドの配当を受け取ってから参加を決める
+        balance += net[:, t]
+        playing[:, t] = entered[:, t] & (balance >= STAKE)
+        balance -= playing[:, t] * STAKE
+        net[:, t] -= playing[:, t] * STAKE
+
+        won = playing[:, t] & correct[:, t]
+        winners = won.sum()
+        if winners > 0:
+            # 期間の最後のラウンドの配当は最終ラウンドに計上する
+            paid_at = min(t + SETTLE_OFFSET, n_rounds - 1)
+            net[:, paid_at] += won * (playing[:, t].sum() * STAKE * BONUS // winners)
+
+    won = playing & correct
+    return playing, won, net
+
+
+def backtest(ohlcv, ai_users, registry, live=True):
+    df = build_features(ohlcv)
+    X = live_features(df) if live else df[FEATURE_COLS]
+    winning = winning_choices(df)
+
+    started = time.perf_counter()
+    preds = predict_batch(registry, ai_users, X)
+    predict_ms = (time.perf_counter() - started) * 1000
+
+    playing, won, net = simulate(preds, winning)
+    points = INITIAL_POINTS + np.cumsum(net, axis=1)
+
+    summary = pd.DataFrame(
+        {
+            "model": [ai["file"] for ai in ai_users],
+            "rounds": playing.sum(axis=1),
+            "wins": won.sum(axis=1),
+            "hit_rate": won.sum(axis=1) / np.maximum(playing.sum(axis=1), 1),
+            "final_points": points[:, -1],
+            "max_drawdown": (np.maximum.accumulate(points, axis=1) - points).max(
+                axis=1
+            ),
+        }
+    )
+    curves = pd.DataFrame(
+        points.T, index=df.index, columns=[ai["file"] for ai in ai_users]
+    )
+    return summary, curves, predict_ms
+
+
+def default_ai_users(model_dir):
+    """
+    対象モデル。AI_USERS が無ければ models/ 内の全モデルを対象にする
+    （<名前>_sc をそのモデルのスケーラーとみなす）
+    """
+    if os.getenv("AI_USERS"):
+        return json.loads(os.getenv("AI_USERS"))
+
+    stems = {
+        os.path.splitext(f)[0]
+        for f in os.listdir(model_dir)
+        if f.endswith((".pkl", ".npz"))
+    }
+    ai_users = []
+    for stem in sorted(stems):
+        if stem.endswith("_sc"):
+            continue
+        ai = {"file": f"{stem}.pkl"}
+        if f"{stem}_sc" in stems:
+            ai["scaler_file"] = f"{stem}_sc.pkl"
+        ai_users.append(ai)
+    return ai_users
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--since", default="2024-01-01", help="開始日 (UTC)")
+    parser.add_argument("--csv", help="ohlcvのCSV（無ければ取引所から取得して保存）")
+    parser.add_argument("--out", help="ポイント推移の出力先CSV")
+    parser.add_argument("--models", default="models")
+    parser.add_argument(
+        "--closed",
+        action="store_true",
+        help="開始時刻の足を確定済みとして扱う（学習時と同じ特徴量）",
+    )
+    args = parser.parse_args()
+
+    if args.csv and os.path.exists(args.csv):
+        ohlcv = pd.read_csv(args.csv).to_numpy().tolist()
+    else:
+        since = datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc)
+        ohlcv = fetch_history(int(since.timestamp() * 1000))
+        if args.csv:
+            columns = ["timestamp", "open", "high", "low", "close", "volume"]
+            pd.DataFrame(ohlcv, columns=columns).to_csv(args.csv, index=False)
+    print(f"ohlcv: {len(ohlcv)}本")
+
+    registry = ModelRegistry(os.path.abspath(args.models))
+    ai_users = default_ai_users(args.models)
+
+    started = time.perf_counter()
+    summary, curves, predict_ms = backtest(
+        ohlcv, ai_users, registry, live=not args.closed
+    )
+    total_ms = (time.perf_counter() - started) * 1000
+
+    print(summary.to_string(index=False))
+    print(f"予測: {predict_ms:.0f}ms / 合計: {total_ms:.0f}ms")
+
+    if args.out:
+        curves.to_csv(args.out)
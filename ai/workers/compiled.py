@@ -0,0 +1,197 @@
+"""
+scikit-learnのモデルをNumPy配列だけで評価できる形式（.npz）に変換・評価する
+変換（export）にはsklearnの推定器が必要だが、評価はNumPyのみで行う
+"""
+
+import numpy as np
+
+TREES = "trees"
+LINEAR = "linear"
+SCALER = "scaler"
+
+
+# ---- 変換（sklearnの推定器 -> 配列） ----
+
+
+def _pack_trees(trees):
+    """複数の決定木のノードを1つの配列に連結する。roots は各木の根ノード位置"""
+    roots, feature, threshold, left, right, missing_left, value = ([] for _ in range(7))
+    offset = 0
+    for tree in trees:
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        # 葉は自分自身を指すようにしておき、全木を同じ回数だけ辿れるようにする
+        own = np.arange(offset, offset + n)
+        left.append(np.where(is_leaf, own, tree.children_left + offset))
+        right.append(np.where(is_leaf, own, tree.children_right + offset))
+        missing_left.append(
+            getattr(tree, "missing_go_to_left", np.zeros(n, dtype=np.uint8))
+        )
+        value.append(tree.value[:, 0, :])
+        offset += n
+
+    return {
+        "roots": np.array(roots, dtype=np.int64),
+        "feature": np.concatenate(feature).astype(np.int64),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.int64),
+        "right": np.concatenate(right).astype(np.int64),
+        "missing_left": np.concatenate(missing_left).astype(bool),
+        "value": np.concatenate(value).astype(np.float64),
+        "max_depth": np.array(max(t.max_depth for t in trees)),
+    }
+
+
+def compile_estimator(estimator):
+    """
+    sklearnの推定器を配列のdictに変換する
+    対応: 決定木・ランダムフォレスト・ロジスティック回帰・StandardScaler
+    """
+    if hasattr(estimator, "estimators_"):
+        arrays = _pack_trees([e.tree_ for e in estimator.estimators_])
+        arrays.update(kind=np.array(TREES), average=np.array(True))
+    elif hasattr(estimator, "tree_"):
+        arrays = _pack_trees([estimator.tree_])
+        arrays.update(kind=np.array(TREES), average=np.array(False))
+    elif hasattr(estimator, "coef_"):
+        arrays = {
+            "kind": np.array(LINEAR),
+            "coef": np.asarray(estimator.coef_, dtype=np.float64),
+            "intercept": np.asarray(estimator.intercept_, dtype=np.float64),
+        }
+    elif hasattr(estimator, "scale_") or hasattr(estimator, "mean_"):
+        n = estimator.n_features_in_
+        mean = estimator.mean_ if estimator.with_mean else None
+        scale = estimator.scale_ if estimator.with_std else None
+        return {
+            "kind": np.array(SCALER),
+            "mean": np.zeros(n) if mean is None else np.asarray(mean, np.float64),
+            "scale": np.ones(n) if scale is None else np.asarray(scale, np.float64),
+            "feature_names": _feature_names(estimator),
+        }
+    else:
+        raise TypeError(f"未対応のモデルです: {type(estimator).__name__}")
+
+    arrays["classes"] = np.asarray(estimator.classes_)
+    arrays["feature_names"] = _feature_names(estimator)
+    return arrays
+
+
+def _feature_names(estimator):
+    names = getattr(estimator, "feature_names_in_", None)
+    return np.array([] if names is None else list(names), dtype=str)
+
+
+# ---- 評価（NumPyのみ） ----
+
+
+class CompiledModel:
+    """export済みの .npz から読み込んだモデル"""
+
+    def __init__(self, arrays):
+        self.kind = str(arrays["kind"])
+        self.arrays = arrays
+        self.feature_names = [str(name) for name in arrays["feature_names"]]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as npz:
+            return cls({key: npz[key] for key in npz.files})
+
+    def _matrix(self, X, dtype):
+        # DataFrameなら学習時の列順に並べ替える
+        if self.feature_names and hasattr(X, "columns"):
+            X = X[self.feature_names]
+        return np.asarray(X, dtype=dtype)
+
+    def transform(self, X):
+        """StandardScaler.transform 相当"""
+        a = self.arrays
+        return (self._matrix(X, np.float64) - a["mean"]) / a["scale"]
+
+    def decision_function(self, X):
+        a = self.arrays
+        X = self._matrix(X, np.float64)
+        if np.isnan(X).any():
+            raise ValueError("Input X contains NaN.")
+        scores = X @ a["coef"].T + a["intercept"]
+        return scores[:, 0] if scores.shape[1] == 1 else scores
+
+    def predict(self, X):
+        a = self.arrays
+        if self.kind == TREES:
+            return predict_trees([self], X)[0]
+
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            return a["classes"][(scores > 0).astype(int)]
+        return a["classes"][scores.argmax(axis=1)]
+
+
+def _leaves(packed, X):
+    """全サンプル×全木を同時に根から葉まで辿り、到達した葉のノード番号を返す"""
+    node = np.broadcast_to(packed["roots"], (len(X), len(packed["roots"]))).copy()
+    rows = np.arange(len(X))[:, None]
+    for _ in range(int(packed["max_depth"])):
+        x = X[rows, packed["feature"][node]]
+        go_left = np.where(
+            np.isnan(x), packed["missing_left"][node], x <= packed["threshold"][node]
+        )
+        node = np.where(go_left, packed["left"][node], packed["right"][node])
+    return node
+
+
+def predict_trees(models, X):
+    """
+    木系モデル（複数可）の全ての木を1回の走査でまとめて評価し、モデル毎の予測クラスを返す
+    sklearnと同じく入力はfloat32に変換し、しきい値とは <= で比較する
+    """
+    names = models[0].feature_names
+    for model in models:
+        if model.feature_names != names:
+            raise ValueError("特徴量の列が異なるモデルはまとめて評価できません")
+
+    X = models[0]._matrix(X, np.float32).astype(np.float64)
+
+    # 全モデルのノードを連結する
+    offsets = np.cumsum([0] + [len(m.arrays["left"]) for m in models])
+    packed = {
+        "roots": np.concatenate(
+            [m.arrays["roots"] + o for m, o in zip(models, offsets)]
+        ),
+        "feature": np.concatenate([m.arrays["feature"] for m in models]),
+        "threshold": np.concatenate([m.arrays["threshold"] for m in models]),
+        "left": np.concatenate([m.arrays["left"] + o for m, o in zip(models, offsets)]),
+        "right": np.concatenate(
+            [m.arrays["right"] + o for m, o in zip(models, offsets)]
+        ),
+        "missing_left": np.concatenate([m.arrays["missing_left"] for m in models]),
+        "max_depth": max(int(m.arrays["max_depth"]) for m in models),
+    }
+    leaves = _leaves(packed, X)
+
+    predictions = []
+    start = 0
+    for model, offset in zip(models, offsets):
+        a = model.arrays
+        end = start + len(a["roots"])
+        leaf_value = a["value"][leaves[:, start:end] - offset]
+
+        if a["average"]:
+            # RandomForest: 木毎に正規化した確率を足し合わせて平均する
+            normalizer = leaf_value.sum(axis=2, keepdims=True)
+            normalizer[normalizer == 0] = 1
+            proba = np.zeros((len(X), leaf_value.shape[2]))
+            for i in range(leaf_value.shape[1]):
+                proba += leaf_value[:, i] / normalizer[:, i]
+            proba /= leaf_value.shape[1]
+        else:
+            proba = leaf_value[:, 0]
+
+        predictions.append(a["classes"][proba.argmax(axis=1)])
+        start = end
+
+    return predictions
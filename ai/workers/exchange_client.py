@@ -0,0 +1,46 @@
+import os
+import random
+import time
+
+import ccxt
+
+import metrics
+
+
+class ExchangeClient:
+    """
+    ccxt の取引所クライアントに、通信エラー・タイムアウト時の再試行を加えたもの
+    （ワーカーは1回の実行で1度しか問い合わせないため、レート制限は ccxt に任せる）
+    """
+
+    def __init__(self, exchange, retries=2, backoff=0.5):
+        self.exchange = exchange
+        self.retries = retries
+        self.backoff = backoff
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.exchange.fetch_ohlcv(
+                    symbol, timeframe, since=since, limit=limit
+                )
+            except ccxt.NetworkError:
+                # RequestTimeout（ccxt の timeout 超過）も含む
+                if attempt == self.retries:
+                    raise
+                metrics.EXCHANGE_RETRIES.inc()
+                time.sleep(self.backoff * 2**attempt * random.uniform(1, 1.5))
+
+
+def create():
+    """
+    Binance のクライアントを作る
+    タイムアウト・再試行はバックエンドと同じ環境変数で設定する
+    """
+    timeout = float(os.getenv("EXCHANGE_TIMEOUT", "10"))
+    exchange = ccxt.binance({"enableRateLimit": True, "timeout": int(timeout * 1000)})
+    return ExchangeClient(
+        exchange,
+        retries=int(os.getenv("EXCHANGE_RETRIES", "2")),
+        backoff=float(os.getenv("EXCHANGE_BACKOFF_SEC", "0.5")),
+    )
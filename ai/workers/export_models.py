@@ -0,0 +1,28 @@
+"""
+models/*.pkl を NumPy のみで評価できる .npz に変換する
+実行にはscikit-learnが必要（Dockerのビルドステージで実行する）
+
+    python workers/export_models.py [models_dir]
+"""
+
+import os
+import sys
+
+import joblib
+import numpy as np
+
+from compiled import compile_estimator
+
+if __name__ == "__main__":
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else "models"
+
+    for file in sorted(os.listdir(model_dir)):
+        if not file.endswith(".pkl"):
+            continue
+
+        path = os.path.join(model_dir, file)
+        arrays = compile_estimator(joblib.load(path))
+
+        out = os.path.splitext(path)[0] + ".npz"
+        np.savez_compressed(out, **arrays)
+        print(f"{file} -> {os.path.basename(out)} ({os.path.getsize(out)} bytes)")
@@ -0,0 +1,184 @@
+import holidays
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+
+# volumeがこれ以下のデータは異常値として扱う
+MIN_VOLUME = 10
+
+# 特徴量の算出に必要な過去の足の本数（log_ret_24h, vola_24h 用に24本前まで）
+LOOKBACK = 24
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+# モデルの入力とする特徴量（学習時の列順）
+FEATURE_COLS = [
+    "mon",
+    "sat",
+    "sun",
+    "thu",
+    "tue",
+    "wed",
+    "is_holiday",
+    "is_off_day",
+    "log_ret_1h",
+    "log_ret_2h",
+    "log_ret_4h",
+    "log_ret_12h",
+    "log_ret_24h",
+    "vola_4h",
+    "vola_24h",
+    "vol_ratio_24h",
+    "bias_24h",
+]
+
+
+def calendar_features(timestamps):
+    """曜日ダミー・祝日フラグをまとめて算出する（timestampはUTCのms）"""
+    days = np.asarray(timestamps, dtype=np.int64) // DAY_MS
+
+    # 1970-01-01は木曜日（dayofweek=3）
+    dayofweek = (days + 3) % 7
+    features = {name: (dayofweek == i).astype(int) for i, name in enumerate(DAY_NAMES)}
+
+    # アメリカの祝日（日付単位で判定）
+    dates = days.astype("datetime64[D]")
+    years = np.unique(dates.astype("datetime64[Y]").astype(int) + 1970).tolist()
+    holiday_dates = np.array(
+        list(holidays.UnitedStates(years=years)), dtype="datetime64[D]"
+    )
+    features["is_holiday"] = np.isin(dates, holiday_dates).astype(int)
+
+    features["is_off_day"] = (
+        features["sat"] | features["sun"] | features["is_holiday"]
+    ).astype(int)
+
+    return features
+
+
+def _shift(values, n):
+    shifted = np.full_like(values, np.nan)
+    shifted[n:] = values[:-n]
+    return shifted
+
+
+def _rolling(values, n, func, **kwargs):
+    # 窓内にNaNを含む場合はNaN（pandasの rolling(n) と同じ扱い）
+    out = np.full_like(values, np.nan)
+    if len(values) >= n:
+        out[n - 1 :] = func(sliding_window_view(values, n), axis=1, **kwargs)
+    return out
+
+
+def build_features(ohlcv):
+    """
+    ohlcv全体の特徴量を一括で算出する
+    欠けている時間帯はNaNの行として補い、1時間毎の連続したDataFrameを返す
+    """
+    data = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+    ts = data[:, 0].astype(np.int64)
+
+    # 1時間毎の連続したグリッドに配置する
+    start = ts.min() // HOUR_MS * HOUR_MS
+    timestamps = np.arange(start, ts.max() + 1, HOUR_MS)
+    grid = np.full((len(timestamps), 5), np.nan)
+    grid[(ts - start) // HOUR_MS] = data[:, 1:]
+
+    close = grid[:, 3]
+    volume = grid[:, 4]
+    volume[volume <= MIN_VOLUME] = np.nan
+
+    features = calendar_features(timestamps)
+
+    # ｎ時間前からのリターン（対数収益率）
+    for n in [1, 2, 4, 12, 24]:
+        features[f"log_ret_{n}h"] = np.log(close / _shift(close, n))
+
+    # ｎ時間のボラティリティ
+    for n in [4, 24]:
+        features[f"vola_{n}h"] = _rolling(features["log_ret_1h"], n, np.std, ddof=1)
+
+    # 出来高比率
+    vol_mean24 = _rolling(volume, 24, np.mean)
+    features["vol_ratio_24h"] = (volume - vol_mean24) / vol_mean24
+
+    # 24h移動平均との乖離
+    sma_24 = _rolling(close, 24, np.mean)
+    features["bias_24h"] = (close - sma_24) / sma_24
+
+    df = pd.DataFrame(
+        {
+            "timestamp": timestamps,
+            "open": grid[:, 0],
+            "high": grid[:, 1],
+            "low": grid[:, 2],
+            "close": close,
+            "volume": volume,
+            **features,
+        },
+        index=pd.to_datetime(timestamps, unit="ms", utc=True),
+    )
+    df.index.name = "datetime"
+    return df
+
+
+class CandleRing:
+    """
+    直近の1時間足を固定長のリングバッファに保持し、
+    指定した時刻1行分の特徴量だけを算出する
+    """
+
+    def __init__(self, size=LOOKBACK + 1):
+        self.size = size
+        self._timestamps = np.full(size, -1, dtype=np.int64)
+        self._close = np.full(size, np.nan)
+        self._volume = np.full(size, np.nan)
+
+    def push(self, candle):
+        ts = int(candle[0])
+        i = ts // HOUR_MS % self.size
+        self._timestamps[i] = ts
+        self._close[i] = candle[4]
+        self._volume[i] = candle[5] if candle[5] > MIN_VOLUME else np.nan
+
+    def extend(self, ohlcv):
+        for candle in ohlcv:
+            self.push(candle)
+
+    def _window(self, timestamp):
+        """timestamp までの size 本を古い順に返す（欠けている足はNaN）"""
+        timestamps = timestamp - HOUR_MS * np.arange(self.size - 1, -1, -1)
+        i = timestamps // HOUR_MS % self.size
+        hit = self._timestamps[i] == timestamps
+        close = np.where(hit, self._close[i], np.nan)
+        volume = np.where(hit, self._volume[i], np.nan)
+        return close, volume
+
+    def feature_row(self, timestamp):
+        """timestamp の足の特徴量を FEATURE_COLS の列順で1行のDataFrameとして返す"""
+        timestamp = int(timestamp)
+        if timestamp not in self._timestamps:
+            raise ValueError(f"timestamp={timestamp} の足がありません")
+
+        close, volume = self._window(timestamp)
+
+        features = {k: v[0] for k, v in calendar_features([timestamp]).items()}
+
+        for n in [1, 2, 4, 12, 24]:
+            features[f"log_ret_{n}h"] = np.log(close[-1] / close[-1 - n])
+
+        log_ret_1h = np.log(close[1:] / close[:-1])
+        for n in [4, 24]:
+            features[f"vola_{n}h"] = np.std(log_ret_1h[-n:], ddof=1)
+
+        vol_mean24 = np.mean(volume[-24:])
+        features["vol_ratio_24h"] = (volume[-1] - vol_mean24) / vol_mean24
+
+        sma_24 = np.mean(close[-24:])
+        features["bias_24h"] = (close[-1] - sma_24) / sma_24
+
+        index = pd.to_datetime([timestamp], unit="ms", utc=True)
+        return pd.DataFrame([features], columns=FEATURE_COLS, index=index)
@@ -1,14 +1,16 @@
 import json
 import os
+import time
 from datetime import datetime, timedelta
 
-import ccxt
-import holidays
-import joblib
-import numpy as np
-import pandas as pd
 import requests
 
+import exchange_client
+import metrics
+from features import FEATURE_COLS, CandleRing
+from model_registry import ModelRegistry
+from scheduler import WorkerStatus, run_forever, serve_health
+
 # 環境変数ロード
 API_URL = os.getenv("API_URL")
 AI_USERS = os.getenv("AI_USERS")
@@ -25,12 +27,42 @@ if not API_URL:
 # AI_USERSを取得
 ai_users = json.loads(AI_USERS)
 
+# 予測の投稿方法（batch: 一括投稿API / single: 1件ずつ投稿）
+SUBMIT_MODE = os.getenv("PREDICTION_SUBMIT_MODE", "batch")
+
+# 実行モード（once: 1回だけ実行して終了 / daemon: 常駐して毎時実行）
+WORKER_MODE = os.getenv("WORKER_MODE", "once")
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080"))
+
+# once モードで実行後にメトリクスを送るPushgateway（未設定なら送らない）
+PUSHGATEWAY_URL = os.getenv("PUSHGATEWAY_URL")
+
+# 常駐モードで正時から何秒後に起床するか・新ラウンドのポーリング間隔と上限
+WAKE_DELAY_SEC = float(os.getenv("WAKE_DELAY_SEC", "5"))
+POLL_SEC = float(os.getenv("POLL_SEC", "10"))
+POLL_TIMEOUT_SEC = float(os.getenv("POLL_TIMEOUT_SEC", "600"))
+
+_exchange = None
+
+
+# 取引所クライアント（プロセス内で共有する）
+def get_exchange():
+    global _exchange
+    if _exchange is None:
+        _exchange = exchange_client.create()
+    return _exchange
+
 
 # 開催中のラウンドを取得
 def get_active_round():
     url = f"{API_URL}/game_rounds/active"
 
-    response = requests.get(url, timeout=10)
+    started = time.perf_counter()
+    response = None
+    try:
+        response = requests.get(url, timeout=10)
+    finally:
+        metrics.observe_http("/game_rounds/active", started, response)
     response.raise_for_status()
 
     data = response.json()
@@ -41,108 +73,68 @@ def get_active_round():
     return data
 
 
+# 予測の一括投稿
+def submit_predictions_batch(game_round_id, payloads):
+    url = f"{API_URL}/game_rounds/{game_round_id}/predictions/batch"
+
+    started = time.perf_counter()
+    response = None
+    try:
+        response = requests.post(url, json={"items": payloads}, timeout=30)
+    finally:
+        metrics.observe_http("/game_rounds/{id}/predictions/batch", started, response)
+    response.raise_for_status()
+
+    for result in response.json():
+        if result["status_code"] == 200:
+            print("予測の投稿に成功！", result["prediction"])
+        else:
+            print("予測の投稿失敗", result["user_uid"], result["detail"])
+
+
 # 予測用データの取得
 def get_ohlcv_data(dt_from):
     since = int(dt_from.timestamp() * 1000)
 
-    exchange = ccxt.binance({"enableRateLimit": True})
+    # バックエンドのローソク足ストアから取得（失敗時のみ取引所へ直接問い合わせる）
+    try:
+        url = f"{API_URL}/candles"
+        started = time.perf_counter()
+        response = None
+        try:
+            response = requests.get(url, params={"since": since}, timeout=30)
+        finally:
+            metrics.observe_http("/candles", started, response)
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        print("ローソク足ストアからの取得失敗、取引所から直接取得します")
+        print(e)
+
+    exchange = get_exchange()
     symbol = "BTC/USDT"
     timeframe = "1h"
-    since = since
-    ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since)
+    started = time.perf_counter()
+    try:
+        ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since)
+    except Exception as e:
+        metrics.observe_exchange(started, e)
+        raise
+    metrics.observe_exchange(started)
 
     return ohlcv
 
 
-# 特徴量の追加
-def pre_processing(ohlcv):
-    df = pd.DataFrame(ohlcv)
-    df.columns = ["timestamp", "open", "high", "low", "close", "volume"]
-
-    # datetime列を追加（timestampから算出）
-    df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
-
-    # datetime列をindexとし、1h毎のデータにする
-    df_resample = df.set_index("datetime").resample("1h").asfreq()
-
-    # timestamp全体をdatetimeから算出しセットしなおす
-    df_resample["timestamp"] = df_resample.index.map(
-        lambda x: int(x.timestamp() * 1000)
-    )
-
-    # volumeが低すぎるデータは異常値としてNaNにする
-    min_vol = 10
-    df_resample.loc[df_resample["volume"] <= min_vol, "volume"] = np.nan
-
-    # 欠損を含む行の確認
-    df_resample[df_resample.isnull().any(axis=1)]
-    df_feat1 = df_resample.copy()
-
-    # day列を追加
-    day_names = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
-    df_feat1["day"] = df_feat1.index.dayofweek.map(lambda x: day_names[x])
-
-    # dayをダミー変数化
-    day = pd.get_dummies(df_feat1["day"], drop_first=False, dtype=int)
-    df_feat1 = pd.concat([df_feat1, day], axis=1).drop("day", axis=1)
-
-    # 足りない列（sat, sunなど）を 0 で埋めて強制的に作成する
-    for col in day_names:
-        if col not in df_feat1.columns:
-            df_feat1[col] = 0
-
-    # dfに存在する"年"のリストを作成する
-    years = df_feat1.index.year.unique().tolist()
-
-    # アメリカの祝日を取得
-    us_holidays = holidays.UnitedStates(years=years)
-
-    # 特徴量の追加　祝日 (1: 祝日, 0: 平日)
-    df_feat1["is_holiday"] = df_feat1.index.map(lambda x: 1 if x in us_holidays else 0)
-
-    df_feat1["is_off_day"] = (
-        df_feat1[["sat", "sun", "is_holiday"]].any(axis=1).astype(int)
-    )
-
-    df_feat2 = df_feat1.copy()
-
-    # ｎ時間前からのリターン（対数収益率）
-    for n in [1, 2, 4, 12, 24]:
-        df_feat2[f"log_ret_{n}h"] = np.log(
-            df_feat2["close"] / df_feat2["close"].shift(n)
-        )
-
-    # ｎ時間のボラティリティ
-    for n in [4, 24]:
-        df_feat2[f"vola_{n}h"] = df_feat2["log_ret_1h"].rolling(n).std()
-
-    # 出来高比率
-    vol_mean24 = df_feat2["volume"].rolling(24).mean()
-    df_feat2["vol_ratio_24h"] = (df_feat2["volume"] - vol_mean24) / vol_mean24
-
-    # 24h移動平均との乖離
-    sma_24 = df_feat2["close"].rolling(24).mean()
-    df_feat2["bias_24h"] = (df_feat2["close"] - sma_24) / sma_24
-
-    return df_feat2
+# 計測開始からの経過時間(ms)
+def lap(started):
+    return (time.perf_counter() - started) * 1000
 
 
-# 予測
-def predict(model_path, scaler_path, X):
-    if scaler_path:
-        scaler = joblib.load(scaler_path)
-        X = scaler.transform(X)
-        X = pd.DataFrame(X, columns=feature_cols)
+# 1ラウンド分の予測・投稿。各処理の所要時間(ms)を返す
+def run_round(data, registry):
+    timings = {}
+    started = time.perf_counter()
 
-    model = joblib.load(model_path)
-    y = model.predict(X)
-
-    return y
-
-
-if __name__ == "__main__":
-    # アクティブラウンドを取得
-    data = get_active_round()
     game_round_id = data.get("id")
     dt_start_at = datetime.fromisoformat(data.get("start_at").replace("Z", "+00:00"))
     print("アクティブラウンドID:", {game_round_id})
@@ -152,66 +144,58 @@ if __name__ == "__main__":
     # Binanceからohlcvを取得
     dt_from = dt_start_at - timedelta(hours=30)
     ohlcv = get_ohlcv_data(dt_from)
+    timings["ohlcv_ms"] = lap(started)
     print("ohlcv取得成功:")
     print(ohlcv[-5:])
     print()
 
-    # データ前処理実施
-    df = pre_processing(ohlcv)
-    print("データ前処理成功 tailを表示")
-    print(df.tail())
-    print()
-
     start_unixtime = int(dt_start_at.timestamp() * 1000)
     print("start_at_timestamp:", start_unixtime)
 
-    df_predict_row = df[df["timestamp"] == start_unixtime]
-    print(f"{df_predict_row=}")
+    # 直近の足だけをリングバッファに積み、予測対象の1行分の特徴量を算出
+    ring = CandleRing()
+    ring.extend(ohlcv)
+    X = ring.feature_row(start_unixtime)
+    timings["features_ms"] = lap(started) - timings["ohlcv_ms"]
+    print("特徴量算出成功")
+    print(f"{X=}")
     print()
 
     # AI予測
     print("予測投稿開始")
-    feature_cols = [
-        "mon",
-        "sat",
-        "sun",
-        "thu",
-        "tue",
-        "wed",
-        "is_holiday",
-        "is_off_day",
-        "log_ret_1h",
-        "log_ret_2h",
-        "log_ret_4h",
-        "log_ret_12h",
-        "log_ret_24h",
-        "vola_4h",
-        "vola_24h",
-        "vol_ratio_24h",
-        "bias_24h",
-    ]
-    X = df_predict_row[feature_cols]
-    print(f"{X=}")
-
     url = f"{API_URL}/game_rounds/{game_round_id}/predictions"
-    model_dir = os.path.abspath("models")
+    predicted = lap(started)
+    results = registry.predict_all(ai_users, X, FEATURE_COLS)
+    timings["predict_ms"] = lap(started) - predicted
 
-    for ai in ai_users:
+    submitted = lap(started)
+    payloads = []
+    for ai, choice, model_timings, error in results:
         try:
             print()
-            print("model:", ai.get("file"))
-            model_path = os.path.join(model_dir, ai.get("file"))
+            print("model:", ai.get("file"), model_timings)
+            if "predict_ms" in model_timings:
+                metrics.MODEL_PREDICT_DURATION.labels(ai.get("file")).observe(
+                    model_timings["predict_ms"] / 1000
+                )
 
-            scaler_path = None
-            if ai.get("scaler_file"):
-                scaler_path = os.path.join(model_dir, ai.get("scaler_file"))
+            if error:
+                raise error
 
-            y = predict(model_path, scaler_path, X)
-            choice = y[0].item()
             print("choice:", choice)
 
             payload = {"user_uid": ai.get("uuid"), "choice": choice}
-            response = requests.post(url, json=payload, timeout=10)
+
+            if SUBMIT_MODE == "batch":
+                payloads.append(payload)
+                continue
+
+            posted = time.perf_counter()
+            response = None
+            try:
+                response = requests.post(url, json=payload, timeout=10)
+            finally:
+                metrics.observe_http("/game_rounds/{id}/predictions", posted, response)
             response.raise_for_status()
 
             print("予測の投稿に成功！")
@@ -220,3 +204,59 @@ if __name__ == "__main__":
         except Exception as e:
             print("予測・投稿失敗")
             print(e)
+
+    # まとめて1リクエスト・1トランザクションで投稿する
+    if payloads:
+        print()
+        try:
+            submit_predictions_batch(game_round_id, payloads)
+        except Exception as e:
+            print("予測の一括投稿失敗")
+            print(e)
+
+    timings["submit_ms"] = lap(started) - submitted
+    timings["total_ms"] = lap(started)
+    return timings
+
+
+# run_round の結果をメトリクスに記録する
+def run_round_observed(data, registry):
+    try:
+        timings = run_round(data, registry)
+    except Exception:
+        metrics.RUNS.labels("failure").inc()
+        raise
+    metrics.RUNS.labels("success").inc()
+    metrics.observe_timings(timings)
+    return timings
+
+
+if __name__ == "__main__":
+    registry = ModelRegistry(os.path.abspath("models"))
+    registry.load_all(ai_users)
+
+    if WORKER_MODE == "daemon":
+        # モデルと取引所クライアントを温めた状態で常駐する
+        get_exchange()
+        status = WorkerStatus()
+        status.update(
+            model_load_ms=registry.load_ms(),
+            model_load_errors=registry.load_errors(),
+        )
+        serve_health(status, HEALTH_PORT)
+        run_forever(
+            get_active_round,
+            lambda data: run_round_observed(data, registry),
+            status,
+            WAKE_DELAY_SEC,
+            POLL_SEC,
+            POLL_TIMEOUT_SEC,
+        )
+    else:
+        try:
+            timings = run_round_observed(get_active_round(), registry)
+            print()
+            print("処理時間:", timings)
+        finally:
+            if PUSHGATEWAY_URL:
+                metrics.push(PUSHGATEWAY_URL)
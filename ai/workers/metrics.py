@@ -0,0 +1,92 @@
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    push_to_gateway,
+)
+
+# once モードではプロセスがすぐ終了するため、ワーカー専用のレジストリを
+# Pushgateway へ送る（daemon モードでは /metrics で公開する）
+REGISTRY = CollectorRegistry()
+
+STAGE_DURATION = Histogram(
+    "worker_stage_duration_seconds",
+    "1ラウンドの各処理の所要時間（ohlcv / features / predict / submit / total）",
+    ["stage"],
+    registry=REGISTRY,
+)
+
+MODEL_PREDICT_DURATION = Histogram(
+    "worker_model_predict_duration_seconds",
+    "モデル1つあたりの予測時間",
+    ["model"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1),
+    registry=REGISTRY,
+)
+
+HTTP_DURATION = Histogram(
+    "worker_http_request_duration_seconds",
+    "バックエンドへのHTTPリクエストの所要時間",
+    ["endpoint", "status"],
+    registry=REGISTRY,
+)
+
+EXCHANGE_DURATION = Histogram(
+    "worker_exchange_fetch_ohlcv_duration_seconds",
+    "取引所の fetch_ohlcv の所要時間（ローソク足ストアから取得できない場合のみ）",
+    registry=REGISTRY,
+)
+EXCHANGE_ERRORS = Counter(
+    "worker_exchange_fetch_ohlcv_errors_total",
+    "取引所の fetch_ohlcv の失敗回数",
+    ["error"],
+    registry=REGISTRY,
+)
+
+EXCHANGE_RETRIES = Counter(
+    "worker_exchange_retries_total",
+    "取引所への問い合わせの再試行回数",
+    registry=REGISTRY,
+)
+
+RUNS = Counter(
+    "worker_runs_total",
+    "ラウンドの予測処理の実行回数",
+    ["result"],
+    registry=REGISTRY,
+)
+
+
+def observe_timings(timings):
+    """run_round が返す各処理の所要時間(ms)を記録する"""
+    for key, elapsed_ms in timings.items():
+        STAGE_DURATION.labels(key.removesuffix("_ms")).observe(elapsed_ms / 1000)
+
+
+def observe_http(endpoint, started, response=None):
+    status = str(response.status_code) if response is not None else "error"
+    HTTP_DURATION.labels(endpoint, status).observe(time.perf_counter() - started)
+
+
+def observe_exchange(started, error=None):
+    EXCHANGE_DURATION.observe(time.perf_counter() - started)
+    if error is not None:
+        EXCHANGE_ERRORS.labels(type(error).__name__).inc()
+
+
+def render():
+    """/metrics のレスポンス本文と Content-Type"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def push(gateway_url, job="ai-worker"):
+    """Pushgateway へ送る（失敗しても処理は止めない）"""
+    try:
+        push_to_gateway(gateway_url, job=job, registry=REGISTRY)
+    except Exception as e:
+        print("メトリクスの送信失敗")
+        print(e)
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from compiled import TREES, CompiledModel, predict_trees
+
+
+def scale_features(scaler, X, feature_cols):
+    """
+    スケーラーで変換した特徴量を DataFrame で返す
+    スケーラーの学習時の列順に並べてから変換し、出力にもその列名を付ける
+    （sklearn は学習時と異なる列順の DataFrame を受け付けない）
+    """
+    names = getattr(scaler, "feature_names_in_", None)  # sklearn
+    if names is None:
+        names = getattr(scaler, "feature_names", None)  # CompiledModel
+    if names is None or len(names) == 0:
+        # 列名なしで学習したスケーラーは feature_cols の順で渡す
+        names = feature_cols
+    X = X[list(names)]
+    return pd.DataFrame(scaler.transform(X), columns=X.columns, index=X.index)
+
+
+class ModelRegistry:
+    """
+    モデル・スケーラーを1回だけロードして保持し、全AIユーザーの予測を実行する
+    export済みの .npz があればNumPyのみで評価し（木系モデルは1回の走査でまとめて評価）、
+    なければpickleをsklearnで読み込みスレッドプールで並列実行する
+    """
+
+    def __init__(self, model_dir, max_workers=None):
+        self.model_dir = model_dir
+        self.max_workers = max_workers
+        self._models = {}  # ファイル名 -> ロード済みオブジェクト
+        self._load_ms = {}  # ファイル名 -> ロード時間
+        self._load_errors = {}  # ファイル名 -> load_all でのロード失敗
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, file):
+        # 同じファイル（共有スケーラーなど）は1度だけロードする
+        with self._lock:
+            lock = self._locks.setdefault(file, threading.Lock())
+
+        with lock:
+            if file not in self._models:
+                started = time.perf_counter()
+                if self.is_compiled(file):
+                    self._models[file] = CompiledModel.load(self._compiled_path(file))
+                else:
+                    # sklearnはexport前のモデルを使う場合のみ必要
+                    import joblib
+
+                    # 非圧縮pickle内の大きなndarrayはメモリマップで読む
+                    path = os.path.join(self.model_dir, file)
+                    self._models[file] = joblib.load(path, mmap_mode="r")
+                self._load_ms[file] = (time.perf_counter() - started) * 1000
+
+        return self._models[file]
+
+    def _compiled_path(self, file):
+        return os.path.join(self.model_dir, os.path.splitext(file)[0] + ".npz")
+
+    def is_compiled(self, file):
+        return os.path.exists(self._compiled_path(file))
+
+    def load_all(self, ai_users):
+        """
+        全モデル・スケーラーを先にロードする
+        ロードできないファイルがあっても止めず、そのファイルを使うユーザーだけ
+        predict_all で失敗させる（get で再度ロードを試みる）
+        """
+        files = {ai["file"] for ai in ai_users}
+        files |= {ai["scaler_file"] for ai in ai_users if ai.get("scaler_file")}
+
+        def load(file):
+            try:
+                self.get(file)
+            except Exception as e:
+                print(f"モデルのロード失敗: {file}")
+                print(e)
+                self._load_errors[file] = str(e)
+
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            list(executor.map(load, files))
+
+    def load_ms(self):
+        """ファイル毎のロード時間(ms)"""
+        return dict(self._load_ms)
+
+    def load_errors(self):
+        """load_all でロードできなかったファイルとエラー"""
+        return dict(self._load_errors)
+
+    def predict(self, ai, X, feature_cols):
+        """1ユーザー分の予測。(choice, timings) を返す"""
+        timings = {}
+
+        if ai.get("scaler_file"):
+            scaler = self.get(ai["scaler_file"])
+            timings["scaler_load_ms"] = self._load_ms[ai["scaler_file"]]
+            X = scale_features(scaler, X, feature_cols)
+
+        model = self.get(ai["file"])
+        timings["load_ms"] = self._load_ms[ai["file"]]
+
+        started = time.perf_counter()
+        y = model.predict(X[feature_cols])
+        timings["predict_ms"] = (time.perf_counter() - started) * 1000
+
+        return y[0].item(), timings
+
+    def predict_all(self, ai_users, X, feature_cols):
+        """
+        全AIユーザーの予測を実行する
+        戻り値は ai_users と同じ順の (ai, choice, timings, error) のリスト
+        """
+        if all(self.is_compiled(ai["file"]) for ai in ai_users):
+            return self._predict_compiled(ai_users, X, feature_cols)
+
+        def run(ai):
+            try:
+                choice, timings = self.predict(ai, X, feature_cols)
+                return ai, choice, timings, None
+            except Exception as e:
+                return ai, None, {}, e
+
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            return list(executor.map(run, ai_users))
+
+    def _predict_compiled(self, ai_users, X, feature_cols):
+        results = {}
+
+        # 木系モデルは全モデルの全ての木を1回の走査でまとめて評価する
+        trees = []
+        for i, ai in enumerate(ai_users):
+            try:
+                if self.get(ai["file"]).kind == TREES:
+                    trees.append(i)
+            except Exception as e:
+                results[i] = (ai, None, {}, e)
+
+        if trees:
+            started = time.perf_counter()
+            try:
+                models = [self.get(ai_users[i]["file"]) for i in trees]
+                ys = predict_trees(models, X[feature_cols])
+                errors = [None] * len(trees)
+            except Exception as e:
+                ys = [None] * len(trees)
+                errors = [e] * len(trees)
+            predict_ms = (time.perf_counter() - started) * 1000
+
+            for i, y, error in zip(trees, ys, errors):
+                ai = ai_users[i]
+                timings = {
+                    "load_ms": self._load_ms[ai["file"]],
+                    "predict_ms": predict_ms,
+                    "batched": len(trees),
+                }
+                choice = None if y is None else y[0].item()
+                results[i] = (ai, choice, timings, error)
+
+        # ロジスティック回帰などは1件ずつ（いずれも行列演算1回で済む）
+        for i, ai in enumerate(ai_users):
+            if i in results:
+                continue
+            try:
+                choice, timings = self.predict(ai, X, feature_cols)
+                results[i] = (ai, choice, timings, None)
+            except Exception as e:
+                results[i] = (ai, None, {}, e)
+
+        return [results[i] for i in range(len(ai_users))]
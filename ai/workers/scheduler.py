@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+
+
+class WorkerStatus:
+    """常駐モードの状態。ヘルスチェック用エンドポイントでJSONとして返す"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "runs": 0,
+            "failures": 0,
+            "last_round_id": None,
+            "last_run_at": None,
+            "last_timings": None,
+            "last_error": None,
+            "next_wake_at": None,
+        }
+
+    def update(self, **kwargs):
+        with self._lock:
+            self._data.update(kwargs)
+
+    def record_run(self, round_id, timings, error=None):
+        with self._lock:
+            self._data["runs"] += 1
+            if error:
+                self._data["failures"] += 1
+            else:
+                self._data["last_round_id"] = round_id
+            self._data["last_run_at"] = datetime.now(timezone.utc).isoformat()
+            self._data["last_timings"] = timings
+            self._data["last_error"] = str(error) if error else None
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._data)
+
+
+def serve_health(status, port):
+    """
+    GET /health で状態、GET /metrics でPrometheus形式のメトリクスを返す
+    HTTPサーバーをバックグラウンドで起動する
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/health":
+                body = json.dumps(status.snapshot(), ensure_ascii=False).encode()
+                content_type = "application/json"
+            elif self.path == "/metrics":
+                body, content_type = metrics.render()
+            else:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # アクセスログは出さない
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"ヘルスチェック: http://0.0.0.0:{port}/health")
+    return server
+
+
+def seconds_until_next_hour(delay_sec):
+    """次の正時 + delay_sec までの秒数"""
+    now = time.time()
+    return (now // 3600 + 1) * 3600 + delay_sec - now
+
+
+def run_forever(
+    get_active_round, run_round, status, wake_delay_sec, poll_sec, poll_timeout_sec
+):
+    """
+    正時ごとに起床し、新しいアクティブラウンドが見つかったら run_round を実行する
+    起動直後は現在のラウンドが未処理であればすぐに実行する
+    """
+    last_round_id = None
+
+    while True:
+        # 新しいラウンドが作成されるまでポーリングする
+        deadline = time.monotonic() + poll_timeout_sec
+        while True:
+            try:
+                data = get_active_round()
+                if data.get("id") != last_round_id:
+                    break
+            except Exception as e:
+                print("アクティブラウンドの取得失敗")
+                print(e)
+                data = None
+
+            if time.monotonic() >= deadline:
+                data = None
+                break
+            time.sleep(poll_sec)
+
+        if data is not None:
+            round_id = data.get("id")
+            started = time.perf_counter()
+            try:
+                timings = run_round(data)
+                status.record_run(round_id, timings)
+                last_round_id = round_id
+            except Exception as e:
+                print("ラウンドの予測処理失敗")
+                print(e)
+                timings = {"total_ms": (time.perf_counter() - started) * 1000}
+                status.record_run(round_id, timings, error=e)
+            print("処理時間:", timings)
+
+        sleep_sec = seconds_until_next_hour(wake_delay_sec)
+        wake_at = datetime.fromtimestamp(time.time() + sleep_sec, timezone.utc)
+        status.update(next_wake_at=wake_at.isoformat())
+        print(f"次回起床: {wake_at.isoformat()}")
+        time.sleep(sleep_sec)
@@ -0,0 +1,57 @@
+"""add total_rounds,wins to User and index on points
+
+Revision ID: 8a1f2c7d9e40
+Revises: 3c827d456cd5
+Create Date: 2026-10-18 10:12:41.502913
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8a1f2c7d9e40"
+down_revision: Union[str, Sequence[str], None] = "3c827d456cd5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # users - total_rounds, wins
+    op.add_column(
+        "users",
+        sa.Column("total_rounds", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "users", sa.Column("wins", sa.Integer(), nullable=False, server_default="0")
+    )
+
+    # 既存の予想データから集計値を埋める
+    op.execute(
+        """
+        UPDATE users SET total_rounds = agg.rounds, wins = agg.wins
+        FROM (
+            SELECT user_uid,
+                   COUNT(*) AS rounds,
+                   SUM(CASE WHEN is_won THEN 1 ELSE 0 END) AS wins
+            FROM predictions
+            GROUP BY user_uid
+        ) AS agg
+        WHERE users.uid = agg.user_uid
+        """
+    )
+    op.alter_column("users", "total_rounds", server_default=None)
+    op.alter_column("users", "wins", server_default=None)
+
+    # users - points
+    op.create_index(op.f("ix_users_points"), "users", ["points"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_users_points"), table_name="users")
+    op.drop_column("users", "wins")
+    op.drop_column("users", "total_rounds")
@@ -0,0 +1,92 @@
+"""compact chart_data in GameRounds
+
+Revision ID: e2a7c4f19b03
+Revises: c5d93e71a6b2
+Create Date: 2026-10-18 15:02:11.384210
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e2a7c4f19b03"
+down_revision: Union[str, Sequence[str], None] = "c5d93e71a6b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# charts.py と同じ形式（アプリ側の変更に影響されないようここで定義する）
+STEP = 60 * 60 * 1000
+SCALE = 100
+
+game_rounds = sa.table(
+    "game_rounds", sa.column("id", sa.Integer), sa.column("chart_data", sa.JSON)
+)
+
+
+def encode(before, after):
+    points = [*before, *after]
+    start = int(points[0][0]) if points else 0
+
+    prices = []
+    prev = 0
+    for _, price in points:
+        value = round(price * SCALE)
+        prices.append(value - prev)
+        prev = value
+
+    step = 1 if any((int(ts) - start) % STEP for ts, _ in points) else STEP
+    chart = {
+        "start": start,
+        "step": step,
+        "scale": SCALE,
+        "prices": prices,
+        "before": len(before),
+    }
+    offsets = [(int(ts) - start) // step for ts, _ in points]
+    if offsets != list(range(len(points))):
+        chart["offsets"] = offsets
+    return chart
+
+
+def decode(chart):
+    offsets = chart.get("offsets") or range(len(chart["prices"]))
+    points = []
+    value = 0
+    for offset, delta in zip(offsets, chart["prices"]):
+        value += delta
+        points.append([chart["start"] + chart["step"] * offset, value / chart["scale"]])
+    return {"before": points[: chart["before"]], "after": points[chart["before"] :]}
+
+
+def convert(func, is_target):
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(game_rounds.c.id, game_rounds.c.chart_data)).all()
+    params = [
+        {"row_id": row.id, "chart_data": func(row.chart_data)}
+        for row in rows
+        if is_target(row.chart_data)
+    ]
+    if params:
+        conn.execute(
+            game_rounds.update()
+            .where(game_rounds.c.id == sa.bindparam("row_id"))
+            .values(chart_data=sa.bindparam("chart_data")),
+            params,
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # {"before": [[ts, price], ...], "after": [...]} -> 圧縮形式
+    convert(
+        lambda chart: encode(chart.get("before", []), chart.get("after", [])),
+        lambda chart: "prices" not in chart,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    convert(decode, lambda chart: "prices" in chart)
@@ -0,0 +1,666 @@
+"""
+バックエンドの負荷・レイテンシ計測
+
+    # ベンチ用DBにデータを投入（既存データは全て削除される）
+    python bench.py seed --reset --users 100000 --rounds 10000 --predictions 200
+
+    # 取引所を FakeExchange に差し替えたサーバーを起動し、各エンドポイントに同時アクセス
+    python bench.py run --duration 30 --concurrency 32 --out bench_result.json
+
+    # 前回の結果と比較
+    python bench.py run --compare bench_result.json
+
+    # レスポンスのシリアライズ（既定 / FAST_JSON）と圧縮の比較
+    python bench.py serialize --limit 500
+
+DATABASE_URL はベンチ用のDBを指定すること。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import charts
+import database
+import fake_exchange
+import settlement
+from sqlalchemy import text
+
+HOUR = timedelta(hours=1)
+HOUR_MS = int(HOUR.total_seconds() * 1000)
+
+# エンドポイント毎のリクエスト比率
+WEIGHTS = {
+    "active": 50,
+    "create_prediction": 25,
+    "leaderboard": 10,
+    "leaderboard_me": 15,
+}
+
+
+# ---- データ投入 ----
+
+
+async def seed(args):
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    async with database.engine.begin() as conn:
+        if args.reset:
+            await conn.execute(
+                text("TRUNCATE predictions, game_rounds, users, candles CASCADE")
+            )
+
+        raw = await conn.get_raw_connection()
+        pg = raw.driver_connection
+
+        started = time.perf_counter()
+        user_uids = [
+            uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(args.users)
+        ]
+        await pg.copy_records_to_table(
+            "users",
+            columns=[
+                "uid",
+                "name",
+                "is_ai",
+                "status",
+                "points",
+                "total_rounds",
+                "wins",
+            ],
+            records=[
+                (uid, f"bench_{i}", i < 4, "active", rng.randint(0, 20000), 0, 0)
+                for i, uid in enumerate(user_uids)
+            ],
+        )
+        print(f"users: {args.users} ({time.perf_counter() - started:.1f}s)")
+
+        # 最後のラウンドを開催中、判定時刻を過ぎた直近 unsettled 件を判定待ちにする
+        started = time.perf_counter()
+        rounds = []
+        for i in range(args.rounds):
+            start_at = now - HOUR * (args.rounds - 1 - i)
+            target_at = start_at + HOUR * 4
+            before = [
+                (
+                    int(ts.timestamp() * 1000),
+                    fake_exchange.synthetic_candle(int(ts.timestamp() * 1000))[1],
+                )
+                for ts in (start_at - HOUR * (23 - j) for j in range(24))
+            ]
+            base_price = before[-1][1]
+            settled = target_at <= now - HOUR * args.unsettled
+            after = []
+            result_price = winning_choice = None
+            if settled:
+                # /game_rounds/settle と同じ判定（FakeExchange で確定し直しても同じ）
+                ohlcv = [
+                    fake_exchange.synthetic_candle(int(ts.timestamp() * 1000))
+                    for ts in (start_at + HOUR * (j + 1) for j in range(3))
+                ]
+                result_price = ohlcv[-1][4]
+                after = [(c[0], c[1]) for c in ohlcv]
+                after.append((ohlcv[-1][0] + HOUR_MS, result_price))
+                winning_choice = int(
+                    settlement.judge_winning_choice(base_price, result_price)
+                )
+            rounds.append(
+                (
+                    i + 1,
+                    start_at,
+                    start_at + HOUR,
+                    target_at,
+                    base_price,
+                    result_price,
+                    winning_choice,
+                    json.dumps(charts.encode(before, after)),
+                )
+            )
+        await pg.copy_records_to_table(
+            "game_rounds",
+            columns=[
+                "id",
+                "start_at",
+                "closed_at",
+                "target_at",
+                "base_price",
+                "result_price",
+                "winning_choice",
+                "chart_data",
+            ],
+            records=rounds,
+        )
+        print(f"game_rounds: {args.rounds} ({time.perf_counter() - started:.1f}s)")
+
+        started = time.perf_counter()
+        total = 0
+
+        def predictions():
+            nonlocal total
+            prediction_id = 0
+            # 開催中のラウンドにはベンチ中に予想を登録するため投入しない
+            for round_id, *_, winning_choice, _chart in rounds[:-1]:
+                picked = {rng.randrange(args.users) for _ in range(args.predictions)}
+                choices = [(user, rng.randint(1, 3)) for user in picked]
+                num_winners = sum(choice == winning_choice for _, choice in choices)
+                share = settlement.calc_share(len(choices), num_winners)
+                for user, choice in choices:
+                    prediction_id += 1
+                    is_won = (
+                        None if winning_choice is None else choice == winning_choice
+                    )
+                    yield (
+                        prediction_id,
+                        user_uids[user],
+                        round_id,
+                        choice,
+                        is_won,
+                        share if is_won else 0,
+                    )
+            total = prediction_id
+
+        await pg.copy_records_to_table(
+            "predictions",
+            columns=[
+                "id",
+                "user_uid",
+                "game_round_id",
+                "choice",
+                "is_won",
+                "earned_points",
+            ],
+            records=predictions(),
+        )
+        print(f"predictions: {total} ({time.perf_counter() - started:.1f}s)")
+
+        # 集計値・シーケンスを投入データに合わせる
+        await conn.execute(
+            text(
+                "UPDATE users u SET total_rounds = s.total, wins = s.wins "
+                "FROM (SELECT user_uid, count(*) AS total, "
+                "count(*) FILTER (WHERE is_won) AS wins "
+                "FROM predictions GROUP BY user_uid) s WHERE u.uid = s.user_uid"
+            )
+        )
+        for table in ["game_rounds", "predictions"]:
+            await conn.execute(
+                text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT coalesce(max(id), 1) FROM {table}))"
+                )
+            )
+
+    async with database.engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE"))
+
+    await database.engine.dispose()
+
+
+# ---- サーバー ----
+
+
+def serve(args):
+    """取引所を FakeExchange に差し替えてアプリを起動する"""
+    import uvicorn
+
+    if args.candles:
+        exchange = fake_exchange.FakeExchange.load(
+            args.candles, args.exchange_latency_ms
+        )
+    else:
+        exchange = fake_exchange.FakeExchange(latency_ms=args.exchange_latency_ms)
+    fake_exchange.install(exchange)
+
+    # エンドポイント毎のSQL実行回数・DB時間を集計するため
+    from config import settings
+
+    settings.query_stats = True
+
+    import main
+
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+async def record(args):
+    """実際の取引所からローソク足を取得して保存する（FakeExchange用）"""
+    import candles
+
+    exchange = candles.get_exchange()
+    since = int((datetime.now(timezone.utc) - HOUR * args.hours).timestamp() * 1000)
+    ohlcv = []
+    try:
+        while True:
+            page = await exchange.fetch_ohlcv(
+                candles.SYMBOL, candles.TIMEFRAME, since=since, limit=1000
+            )
+            if not page:
+                break
+            ohlcv.extend(page)
+            since = page[-1][0] + candles.TIMEFRAME_MS[candles.TIMEFRAME]
+            if len(page) < 1000:
+                break
+    finally:
+        await candles.close_exchange()
+
+    with open(args.candles, "w") as f:
+        json.dump(ohlcv, f)
+    print(f"{len(ohlcv)}本を {args.candles} に保存しました")
+
+
+# ---- 計測 ----
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, name, elapsed_ms, status, response=None):
+        query_count = db_ms = None
+        if response is not None:
+            query_count = response.headers.get("x-db-query-count")
+            db_ms = response.headers.get("x-db-time-ms")
+        self.samples.setdefault(name, []).append(
+            (
+                elapsed_ms,
+                status,
+                int(query_count) if query_count else None,
+                float(db_ms) if db_ms else None,
+            )
+        )
+
+    def summary(self, duration):
+        result = {}
+        for name, samples in sorted(self.samples.items()):
+            latencies = sorted(s[0] for s in samples)
+            queries = [s[2] for s in samples if s[2] is not None]
+            db_ms = [s[3] for s in samples if s[3] is not None]
+            result[name] = {
+                "count": len(samples),
+                "errors": sum(1 for s in samples if s[1] >= 400),
+                "rps": len(samples) / duration,
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "p99_ms": percentile(latencies, 99),
+                "max_ms": latencies[-1],
+                "queries": sum(queries) / len(queries) if queries else None,
+                "db_ms": sum(db_ms) / len(db_ms) if db_ms else None,
+            }
+        return result
+
+
+def percentile(sorted_values, p):
+    """最近傍順位法によるパーセンタイル"""
+    index = max(0, -(-len(sorted_values) * p // 100) - 1)
+    return sorted_values[int(index)]
+
+
+async def load_fixtures():
+    async with database.engine.connect() as conn:
+        active_id = (
+            await conn.execute(
+                text(
+                    "SELECT id FROM game_rounds WHERE closed_at > now() "
+                    "ORDER BY start_at DESC LIMIT 1"
+                )
+            )
+        ).scalar()
+        uids = (
+            (await conn.execute(text("SELECT uid FROM users ORDER BY uid LIMIT 20000")))
+            .scalars()
+            .all()
+        )
+    if active_id is None:
+        raise SystemExit("開催中のラウンドがありません。seed を実行してください")
+    return active_id, [str(uid) for uid in uids]
+
+
+async def reset_settled_rounds(count):
+    """
+    直近の判定済みラウンドを判定待ちに戻す
+    （/game_rounds/settle を毎回同じ量で計測するため）
+    確定時に付与したポイント・勝利数も同じトランザクションで差し引く
+    """
+    async with database.engine.begin() as conn:
+        stmt = text(
+            "SELECT id FROM game_rounds WHERE target_at <= now() "
+            "ORDER BY start_at DESC LIMIT :count"
+        )
+        ids = (await conn.execute(stmt, {"count": count})).scalars().all()
+        await conn.execute(
+            text(
+                "UPDATE users u "
+                "SET points = u.points - s.earned, wins = u.wins - s.wins "
+                "FROM (SELECT user_uid, sum(earned_points) AS earned, "
+                "count(*) FILTER (WHERE is_won) AS wins "
+                "FROM predictions WHERE game_round_id = ANY(:ids) "
+                "GROUP BY user_uid) s WHERE u.uid = s.user_uid"
+            ),
+            {"ids": ids},
+        )
+        await conn.execute(
+            text(
+                "UPDATE game_rounds SET result_price = NULL, winning_choice = NULL "
+                "WHERE id = ANY(:ids)"
+            ),
+            {"ids": ids},
+        )
+        await conn.execute(
+            text(
+                "UPDATE predictions SET is_won = NULL, earned_points = 0 "
+                "WHERE game_round_id = ANY(:ids)"
+            ),
+            {"ids": ids},
+        )
+
+
+async def last_prediction_id():
+    async with database.engine.connect() as conn:
+        stmt = text("SELECT coalesce(max(id), 0) FROM predictions")
+        return (await conn.execute(stmt)).scalar()
+
+
+async def remove_predictions_after(prediction_id):
+    """
+    計測中に登録された予想を削除し、引き落とした参加ポイント・参加数を戻す
+    （開催中のラウンドへの予想のため、確定による付与はない）
+    """
+    async with database.engine.begin() as conn:
+        await conn.execute(
+            text(
+                "WITH removed AS (DELETE FROM predictions WHERE id > :id "
+                "RETURNING user_uid) "
+                "UPDATE users u SET points = u.points + s.count * :stake, "
+                "total_rounds = u.total_rounds - s.count "
+                "FROM (SELECT user_uid, count(*) AS count FROM removed "
+                "GROUP BY user_uid) s WHERE u.uid = s.user_uid"
+            ),
+            {"id": prediction_id, "stake": settlement.STAKE},
+        )
+
+
+async def drive(args, base_url):
+    active_id, uids = await load_fixtures()
+    recorder = Recorder()
+
+    # 実行毎に同じ状態から計測するため、終了時に登録した予想を取り消す
+    start_prediction_id = await last_prediction_id()
+    try:
+        return await _drive(args, base_url, active_id, uids, recorder)
+    finally:
+        await remove_predictions_after(start_prediction_id)
+        await database.engine.dispose()
+
+
+async def _drive(args, base_url, active_id, uids, recorder):
+    import httpx
+
+    requests = {
+        "active": lambda r: ("GET", "/game_rounds/active", {}),
+        "create_prediction": lambda r: (
+            "POST",
+            f"/game_rounds/{active_id}/predictions",
+            {"json": {"user_uid": r.choice(uids), "choice": r.randint(1, 3)}},
+        ),
+        "leaderboard": lambda r: ("GET", "/leaderboard", {"params": {"limit": 100}}),
+        "leaderboard_me": lambda r: (
+            "GET",
+            "/leaderboard/me",
+            {"params": {"uid": r.choice(uids)}},
+        ),
+    }
+    names = list(WEIGHTS)
+    weights = [WEIGHTS[name] for name in names]
+
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60
+    ) as client:
+
+        async def call(name, method, url, kwargs, measure):
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = response.status_code
+            except httpx.HTTPError:
+                response, status = None, 599
+            if measure():
+                recorder.add(
+                    name, (time.perf_counter() - started) * 1000, status, response
+                )
+
+        async def worker(worker_id, deadline, measure):
+            r = random.Random(args.seed * 1000 + worker_id)
+            while time.monotonic() < deadline:
+                name = r.choices(names, weights)[0]
+                method, url, kwargs = requests[name](r)
+                await call(name, method, url, kwargs, measure)
+
+        async def settler(deadline, measure):
+            while time.monotonic() < deadline:
+                await reset_settled_rounds(args.settle_rounds)
+                await call("settle", "POST", "/game_rounds/settle", {}, measure)
+                await asyncio.sleep(args.settle_interval)
+
+        start = time.monotonic()
+        measure_from = start + args.warmup
+        deadline = measure_from + args.duration
+
+        def measure():
+            return time.monotonic() >= measure_from
+
+        tasks = [worker(i, deadline, measure) for i in range(args.concurrency)]
+        if args.settle_rounds:
+            tasks.append(settler(deadline, measure))
+        await asyncio.gather(*tasks)
+
+    return recorder.summary(args.duration)
+
+
+def print_summary(summary, previous=None):
+    print(
+        f"{'endpoint':<18}{'count':>8}{'err':>6}{'rps':>9}"
+        f"{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'queries':>9}{'db_ms':>8}"
+    )
+    for name, s in summary.items():
+        line = (
+            f"{name:<18}{s['count']:>8}{s['errors']:>6}{s['rps']:>9.1f}"
+            f"{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}{s['max_ms']:>9.1f}"
+            f"{optional(s['queries']):>9}{optional(s['db_ms']):>8}"
+        )
+        print(line)
+        if previous and name in previous:
+            p = previous[name]
+            diffs = [
+                f"{key}: {change(p[key], s[key])}"
+                for key in ["rps", "p50_ms", "p95_ms", "p99_ms"]
+            ]
+            print(f"{'':<18}前回比 " + " / ".join(diffs))
+
+
+def optional(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def change(before, after):
+    if not before:
+        return "-"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def run(args):
+    server = None
+    base_url = args.url
+    if not base_url:
+        # 取引所を差し替えたサーバーを別プロセスで起動する
+        command = [sys.executable, __file__, "serve", "--port", str(args.port)]
+        command += ["--exchange-latency-ms", str(args.exchange_latency_ms)]
+        if args.candles:
+            command += ["--candles", args.candles]
+        server = subprocess.Popen(
+            command, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+        wait_until_ready(base_url)
+
+    try:
+        summary = asyncio.run(drive(args, base_url))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["endpoints"]
+    print_summary(summary, previous)
+
+    if args.out:
+        config = {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("func", "out", "compare")
+        }
+        with open(args.out, "w") as f:
+            json.dump({"config": config, "endpoints": summary}, f, indent=2)
+
+
+def wait_until_ready(base_url, timeout=30):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/debug/pool", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit("サーバーが起動しませんでした")
+
+
+# ---- シリアライズのマイクロベンチマーク ----
+
+
+async def serialization(args):
+    """
+    ランキング・ラウンド一覧を同一プロセス内で繰り返し取得し、
+    既定の経路（response_model で検証）と FAST_JSON の経路の
+    1レスポンスあたりのCPU時間・バイト数、圧縮後のバイト数・圧縮時間を比較する
+    （DBアクセス・ASGIの処理時間は両経路で共通のため差がシリアライズの差になる）
+    """
+    import httpx
+    import main
+    from compression import CompressionMiddleware
+    from config import settings
+
+    compressor = CompressionMiddleware(None)
+    targets = {
+        "leaderboard": f"/leaderboard?limit={args.limit}",
+        "game_rounds": "/game_rounds?limit=100",
+    }
+    headers = {"accept-encoding": "identity"}
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        print(
+            f"{'':<12} {'path':<10} {'cpu_us':>9} {'bytes':>8} {'gzip':>7} "
+            f"{'gzip_us':>8} {'br':>7} {'br_us':>7}"
+        )
+        for name, path in targets.items():
+            bodies = {}
+            for mode in ("default", "fast_json"):
+                settings.fast_json = mode == "fast_json"
+                await client.get(path, headers=headers)
+
+                started = time.process_time()
+                for _ in range(args.repeat):
+                    response = await client.get(path, headers=headers)
+                cpu_us = (time.process_time() - started) / args.repeat * 1e6
+                response.raise_for_status()
+                body = bodies[mode] = response.content
+
+                sizes = []
+                for encoding in ("gzip", "br"):
+                    started = time.process_time()
+                    for _ in range(args.repeat):
+                        compressed = compressor.compress(body, encoding)
+                    elapsed = (time.process_time() - started) / args.repeat * 1e6
+                    sizes.append(f"{len(compressed):>7} {elapsed:>8.0f}")
+
+                print(
+                    f"{name:<12} {mode:<10} {cpu_us:>9.0f} {len(body):>8} "
+                    + " ".join(sizes)
+                )
+
+            if json.loads(bodies["default"]) != json.loads(bodies["fast_json"]):
+                raise SystemExit(f"{name}: 2つの経路のレスポンスが一致しません")
+
+    await database.engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(required=True)
+
+    p = sub.add_parser("seed", help="ベンチ用データを投入する")
+    p.add_argument("--reset", action="store_true", help="既存データを削除してから投入")
+    p.add_argument("--users", type=int, default=100_000)
+    p.add_argument("--rounds", type=int, default=10_000)
+    p.add_argument(
+        "--predictions", type=int, default=200, help="1ラウンドあたりの予想数"
+    )
+    p.add_argument("--unsettled", type=int, default=24, help="判定待ちにしておく時間数")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=lambda args: asyncio.run(seed(args)))
+
+    p = sub.add_parser("record", help="実際の取引所からローソク足を記録する")
+    p.add_argument("--candles", default="bench_candles.json")
+    p.add_argument("--hours", type=int, default=24 * 30)
+    p.set_defaults(func=lambda args: asyncio.run(record(args)))
+
+    p = sub.add_parser("serve", help="FakeExchange でサーバーを起動する")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--candles")
+    p.add_argument("--exchange-latency-ms", type=float, default=50)
+    p.set_defaults(func=serve)
+
+    p = sub.add_parser("run", help="負荷をかけて計測する")
+    p.add_argument(
+        "--url", help="起動済みサーバーのURL（省略時は serve を別プロセスで起動）"
+    )
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--candles")
+    p.add_argument("--exchange-latency-ms", type=float, default=50)
+    p.add_argument("--duration", type=float, default=30)
+    p.add_argument("--warmup", type=float, default=5)
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument(
+        "--settle-rounds",
+        type=int,
+        default=24,
+        help="毎回判定し直すラウンド数（0で無効）",
+    )
+    p.add_argument("--settle-interval", type=float, default=5)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="結果のJSON出力先")
+    p.add_argument("--compare", help="比較する前回の結果JSON")
+    p.set_defaults(func=run)
+
+    p = sub.add_parser("serialize", help="レスポンスのシリアライズ・圧縮を比較する")
+    p.add_argument("--limit", type=int, default=500, help="ランキングの件数")
+    p.add_argument("--repeat", type=int, default=200)
+    p.set_defaults(func=lambda args: asyncio.run(serialization(args)))
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,55 @@
+import asyncio
+import json
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# 購読者ごとに溜められるイベント数（超えたら切断し、再接続で取り直させる）
+QUEUE_SIZE = 100
+
+
+@dataclass
+class Event:
+    name: str
+    data: dict
+
+    def encode(self) -> str:
+        data = json.dumps(self.data, ensure_ascii=False, separators=(",", ":"))
+        return f"event: {self.name}\ndata: {data}\n\n"
+
+
+class Broadcaster:
+    """
+    ラウンドごとのイベントを、そのラウンドを購読している全接続に配信する
+    （プロセス内のみ）
+    """
+
+    def __init__(self):
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    @contextmanager
+    def subscribe(self, round_id: int):
+        queue: asyncio.Queue[Event | None] = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.setdefault(round_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(round_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[round_id]
+
+    def publish(self, round_id: int, name: str, data: dict):
+        event = Event(name=name, data=data)
+        subscribers = self._subscribers.get(round_id, set())
+        for queue in list(subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # 受信が追いつかない接続は配信対象から外し、終端(None)を送る
+                subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+
+broadcaster = Broadcaster()
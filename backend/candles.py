@@ -0,0 +1,171 @@
+import time
+
+import exchange_client
+import metrics
+import models
+from config import settings
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+SYMBOL = "BTC/USDT"
+TIMEFRAME = "1h"
+
+TIMEFRAME_MS = {
+    "1m": 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "15m": 15 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+
+# 取引所の1リクエストあたりの最大取得件数
+EXCHANGE_PAGE_LIMIT = 1000
+
+_exchange: exchange_client.ExchangeClient | None = None
+
+
+def get_exchange() -> exchange_client.ExchangeClient:
+    """プロセス内で共有する取引所クライアント"""
+    global _exchange
+    if _exchange is None:
+        _exchange = exchange_client.create(settings)
+    return _exchange
+
+
+async def close_exchange():
+    global _exchange
+    if _exchange is not None:
+        await _exchange.close()
+        _exchange = None
+
+
+async def _fetch_from_exchange(symbol, timeframe, start, end):
+    """取引所から start〜end（ms, 両端含む）のローソク足をページングして取得する"""
+    step = TIMEFRAME_MS[timeframe]
+    exchange = get_exchange()
+
+    ohlcv = []
+    since = start
+    while since <= end:
+        limit = min((end - since) // step + 1, EXCHANGE_PAGE_LIMIT)
+        started = time.perf_counter()
+        try:
+            page = await exchange.fetch_ohlcv(
+                symbol, timeframe, since=since, limit=limit
+            )
+        except Exception as e:
+            metrics.observe_exchange(timeframe, started, e)
+            raise
+        metrics.observe_exchange(timeframe, started)
+        page = [c for c in page if since <= c[0] <= end]
+        if not page:
+            break
+        ohlcv.extend(page)
+        since = page[-1][0] + step
+
+    return ohlcv
+
+
+def _missing_ranges(timestamps, stored, step):
+    """保存済みでないタイムスタンプを連続区間 (start, end) にまとめる"""
+    ranges = []
+    for ts in timestamps:
+        if ts in stored:
+            continue
+        if ranges and ranges[-1][1] + step == ts:
+            ranges[-1][1] = ts
+        else:
+            ranges.append([ts, ts])
+    return ranges
+
+
+def group_windows(starts, length, step) -> list[tuple[int, int]]:
+    """
+    各 start から length 本ずつの区間を、重なる・隣接するものどうしでまとめる
+    戻り値は fetch_ohlcv に渡す (since, limit)（離れた区間は別々に取得する）
+    """
+    spans = []
+    for start in sorted(set(starts)):
+        end = start + (length - 1) * step
+        if spans and start <= spans[-1][1] + step:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return [(start, (end - start) // step + 1) for start, end in spans]
+
+
+async def fetch_ohlcv(
+    db: AsyncSession,
+    since: int,
+    limit: int,
+    symbol: str = SYMBOL,
+    timeframe: str = TIMEFRAME,
+) -> list[list[float]]:
+    """
+    ccxtの fetch_ohlcv と同じ形式でローソク足を返す（read-through）。
+    保存済みのローソク足はDBから読み、足りない区間だけ取引所に問い合わせる。
+    確定前の最新足は保存せず、毎回取引所から取得する。
+    取得したローソク足の保存は呼び出し側の commit で確定する。
+    """
+    step = TIMEFRAME_MS[timeframe]
+    now = int(time.time() * 1000)
+
+    # 現在進行中の足と、確定済みの最後の足
+    current = now // step * step
+    last_closed = current - step
+
+    start = -(-since // step) * step  # 切り上げ
+    end = min(start + (limit - 1) * step, current)
+    if start > end:
+        return []
+
+    # 長い期間も扱うため、ORMオブジェクトを作らずに列だけ読む
+    Candle = models.Candle
+    stmt = (
+        select(
+            Candle.timestamp,
+            Candle.open,
+            Candle.high,
+            Candle.low,
+            Candle.close,
+            Candle.volume,
+        )
+        .where(Candle.symbol == symbol)
+        .where(Candle.timeframe == timeframe)
+        .where(Candle.timestamp.between(start, min(end, last_closed)))
+    )
+    stored = {row[0]: list(row) for row in await db.execute(stmt)}
+
+    timestamps = range(start, end + 1, step)
+    ranges = _missing_ranges(timestamps, stored, step)
+
+    fetched = []
+    for range_start, range_end in ranges:
+        fetched.extend(
+            await _fetch_from_exchange(symbol, timeframe, range_start, range_end)
+        )
+
+    closed = [c for c in fetched if c[0] <= last_closed]
+    if closed:
+        stmt = insert(models.Candle).on_conflict_do_nothing()
+        await db.execute(
+            stmt,
+            [
+                {
+                    "symbol": symbol,
+                    "timeframe": timeframe,
+                    "timestamp": c[0],
+                    "open": c[1],
+                    "high": c[2],
+                    "low": c[3],
+                    "close": c[4],
+                    "volume": c[5],
+                }
+                for c in closed
+            ],
+        )
+
+    candles = {**stored, **{c[0]: list(c) for c in fetched}}
+    return [candles[ts] for ts in sorted(candles)]
@@ -0,0 +1,117 @@
+import hashlib
+import json
+
+import numpy as np
+from candles import TIMEFRAME, TIMEFRAME_MS
+from models import ChartData, PriceAtTime
+
+# 価格は 1/SCALE 単位の整数にして差分で持つ（BTC/USDTの刻みは0.01）
+SCALE = 100
+
+
+def encode(
+    before: list[PriceAtTime], after: list[PriceAtTime], timeframe: str = TIMEFRAME
+) -> ChartData:
+    """
+    (timestamp, price) の列を圧縮形式にする
+    時刻は start + step * i、価格は先頭からの差分列で表す
+    """
+    points = [*before, *after]
+    step = TIMEFRAME_MS[timeframe]
+    start = int(points[0][0]) if points else 0
+
+    prices = []
+    prev = 0
+    for _, price in points:
+        value = round(price * SCALE)
+        prices.append(value - prev)
+        prev = value
+
+    chart: ChartData = {
+        "start": start,
+        "step": step,
+        "scale": SCALE,
+        "prices": prices,
+        "before": len(before),
+    }
+
+    # 欠けている足がある場合のみ、各点が start から何 step 目かを持たせる
+    # 足の境界に揃っていない時刻があればミリ秒単位（step=1）で持つ
+    if any((int(ts) - start) % step for ts, _ in points):
+        chart["step"] = step = 1
+    offsets = [(int(ts) - start) // step for ts, _ in points]
+    if offsets != list(range(len(points))):
+        chart["offsets"] = offsets
+
+    return chart
+
+
+def decode(chart: ChartData) -> tuple[list[PriceAtTime], list[PriceAtTime]]:
+    """圧縮形式から (before, after) の (timestamp, price) の列に戻す"""
+    offsets = chart.get("offsets") or range(len(chart["prices"]))
+
+    points = []
+    value = 0
+    for offset, delta in zip(offsets, chart["prices"]):
+        value += delta
+        points.append((chart["start"] + chart["step"] * offset, value / chart["scale"]))
+
+    return points[: chart["before"]], points[chart["before"] :]
+
+
+def with_after(chart: ChartData, after: list[PriceAtTime]) -> ChartData:
+    """判定時の価格（after）を差し替えたチャート"""
+    before, _ = decode(chart)
+    return encode(before, after)
+
+
+def serialize(chart: ChartData) -> tuple[bytes, str]:
+    """レスポンス用のJSONとETag"""
+    body = json.dumps(chart, separators=(",", ":")).encode()
+    return body, '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets で n 点に間引く。戻り値は残す点のインデックス
+    先頭・末尾の点は必ず残し、間の点を n-2 個のバケットに分けて、
+    各バケットから前後のバケットの平均点と作る三角形が最大の点を選ぶ
+    （本来のLTTBは直前に選んだ点を使うが、全バケットをまとめて計算するため
+    直前のバケットの平均点で代用する）
+    """
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # 間の点 x[1:-1] をバケットに分ける（starts はバケットの先頭位置）
+    starts = np.linspace(0, size - 2, n - 1).astype(np.int64)[:-1]
+    counts = np.diff(starts, append=size - 2)
+    inner_x, inner_y = x[1:-1], y[1:-1]
+    mean_x = np.add.reduceat(inner_x, starts) / counts
+    mean_y = np.add.reduceat(inner_y, starts) / counts
+
+    # 各バケットの前後の点（両端は先頭・末尾の点）
+    prev_x = np.concatenate(([x[0]], mean_x[:-1]))
+    prev_y = np.concatenate(([y[0]], mean_y[:-1]))
+    next_x = np.concatenate((mean_x[1:], [x[-1]]))
+    next_y = np.concatenate((mean_y[1:], [y[-1]]))
+
+    bucket = np.repeat(np.arange(n - 2), counts)
+    ax, ay = prev_x[bucket], prev_y[bucket]
+    area = np.abs(
+        (ax - next_x[bucket]) * (inner_y - ay) - (ax - inner_x) * (next_y[bucket] - ay)
+    )
+
+    # バケットの大きさの差は高々1なので、(バケット数, 最大の大きさ) の表にして
+    # 行毎の argmax を取る（はみ出した分は -1 で埋める）
+    cols = np.arange(counts.max())
+    index = starts[:, None] + cols
+    table = np.where(
+        cols < counts[:, None], area[np.minimum(index, len(area) - 1)], -1.0
+    )
+    picked = starts + table.argmax(axis=1) + 1
+
+    return np.concatenate(([0], picked, [size - 1]))
@@ -0,0 +1,102 @@
+import gzip
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+
+# 圧縮しないレスポンス（SSEは逐次送る必要があるため）
+SKIP_CONTENT_TYPES = ("text/event-stream",)
+
+
+class CompressionMiddleware:
+    """
+    一定サイズ以上のレスポンスを brotli / gzip で圧縮する
+    （Accept-Encoding で受け付けられていれば br を優先）
+    SSE・圧縮済みのレスポンスはそのまま流す
+    """
+
+    def __init__(self, app, minimum_size=1024, gzip_level=6, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose_encoding(self, accept_encoding: str) -> str | None:
+        # q=0 は「受け付けない」の意味のため除く（それ以外の q の大小は見ない）
+        accepted = set()
+        for value in accept_encoding.lower().split(","):
+            name, *params = [part.strip() for part in value.split(";")]
+            q = 1.0
+            for param in params:
+                key, _, number = param.partition("=")
+                if key.strip() == "q":
+                    try:
+                        q = float(number)
+                    except ValueError:
+                        q = 0.0
+            if q > 0:
+                accepted.add(name)
+
+        if "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        # 本文を最後まで受け取るまで http.response.start を送らずに保持する
+        # （BaseHTTPMiddleware を通ると本文が分割されて届くため）
+        start = None
+        chunks = []
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or headers.get(
+                    "content-type", ""
+                ).startswith(SKIP_CONTENT_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start["headers"])
+            if len(body) >= self.minimum_size:
+                body = self.compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,61 @@
+from typing import Literal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    # リクエスト毎のSQL実行回数・DB時間をレスポンスヘッダーに出力し、
+    # /debug/pool でプールの状態を公開する（本番では無効のままにすること）
+    query_stats: bool = False
+
+    # /metrics でPrometheus形式のメトリクスを公開する
+    # （認証がないため、公開する場合はネットワーク側で制限すること）
+    metrics: bool = False
+
+    # DBコネクションプール
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800  # 秒。-1で無効
+    db_pool_pre_ping: bool = True
+    # 起動時に開いておくコネクション数（Noneならdb_pool_size）
+    db_pool_warmup: int | None = None
+    # 接続先のプーラーのモード（transaction: PgBouncer/Supavisorのtransactionモード）
+    db_pooler_mode: Literal["session", "transaction"] = "session"
+
+    # /game_rounds/active のキャッシュ保持秒数（他プロセスでの更新の反映待ち上限）
+    active_round_cache_ttl: float = 10
+
+    # 予想登録のグループコミット（指定ミリ秒の間に届いた登録を1トランザクションで処理）
+    # 0なら無効
+    prediction_group_commit_ms: float = 0
+    prediction_group_commit_max: int = 200
+
+    # ランキング・ラウンド一覧を response_model の検証を通さず orjson で返す
+    fast_json: bool = False
+
+    # このバイト数以上のレスポンスを brotli / gzip で圧縮する（0で無効）
+    compression_min_size: int = 0
+
+    # 取引所クライアント（プロセス内で共有）
+    exchange_rate_per_sec: float = 10  # レート制限（回/秒）
+    exchange_burst: int = 10
+    exchange_timeout: float = 10  # 1回あたりのタイムアウト（秒）
+    exchange_retries: int = 2  # 通信エラー・タイムアウト時の再試行回数
+    exchange_backoff_sec: float = 0.5
+    # 連続して失敗したら一定時間問い合わせを止める（サーキットブレーカー）
+    exchange_breaker_failures: int = 5
+    exchange_breaker_reset_sec: float = 30
+
+    # 判定時刻からこの時間を過ぎてもローソク足が揃わないラウンドは
+    # （取引所側の欠損など）、取得できた足だけで判定する
+    settle_fallback_hours: float = 24
+
+    # ラウンド確定方式（orm: 予想をロードして更新 / bulk: UPDATE文で一括更新）
+    # 両方式の結果が一致することは tests/test_settlement.py で確認している
+    settlement_mode: Literal["orm", "bulk"] = "orm"
+
+
+settings = Settings()
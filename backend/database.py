@@ -1,7 +1,13 @@
+import asyncio
 import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from uuid import uuid4
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from config import settings
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 db_url = os.getenv("DATABASE_URL")
 if not db_url:
@@ -12,14 +18,106 @@ if not db_url:
 
 SQLALCHEMY_DATABASE_URL = db_url
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# alembic用のURL（postgresql://）をasyncpgドライバ指定に置き換える
+def to_async_url(url: str):
+    url = make_url(url)
+    if url.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        url = url.set(drivername="postgresql+asyncpg")
+    return url
+
+
+connect_args = {}
+if settings.db_pooler_mode == "transaction":
+    # transactionモードのプーラーでは接続ごとのプリペアドステートメントが使えない
+    connect_args = {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+    }
+
+engine = create_async_engine(
+    to_async_url(SQLALCHEMY_DATABASE_URL),
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    connect_args=connect_args,
+)
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+class CheckoutStats:
+    """コネクション取得待ち時間（直近window件）の集計"""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.max_ms = 0.0
+        self._recent: deque[float] = deque(maxlen=window)
+
+    def record(self, elapsed_ms: float):
+        self.count += 1
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self._recent.append(elapsed_ms)
+
+    def summary(self) -> dict:
+        recent = sorted(self._recent)
+
+        def pct(p):
+            if not recent:
+                return 0.0
+            return recent[min(int(len(recent) * p), len(recent) - 1)]
+
+        return {
+            "count": self.count,
+            "p50_ms": pct(0.5),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": self.max_ms,
+        }
+
+
+checkout_stats = CheckoutStats()
+
+
+def pool_status() -> dict:
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.db_max_overflow,
+        "checkout": checkout_stats.summary(),
+    }
+
+
+async def warm_up():
+    """起動時にプールのコネクションを開いておく"""
+    n = settings.db_pool_warmup
+    if n is None:
+        n = settings.db_pool_size
+    if n <= 0:
+        return
+
+    conns = await asyncio.gather(*(engine.connect() for _ in range(n)))
+    for conn in conns:
+        await conn.close()
+
+
+@asynccontextmanager
+async def open_session():
+    async with SessionLocal() as db:
+        # コネクション取得待ち時間を計測する
+        started = time.perf_counter()
+        await db.connection()
+        checkout_stats.record((time.perf_counter() - started) * 1000)
+
+        yield db
 
 
 # FastAPIで利用するためのDBセッション取得関数
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with open_session() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,197 @@
+import asyncio
+import random
+import time
+
+import ccxt.async_support as ccxt
+import metrics
+
+
+class ExchangeUnavailable(Exception):
+    """サーキットブレーカーが開いている間、取引所へ問い合わせずに返すエラー"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            f"取引所への接続を一時停止中です（{retry_after:.0f}秒後に再開）"
+        )
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """プロセス内で共有するレート制限（rate 回/秒、最大 burst 回まで連続可）"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    連続 failure_threshold 回失敗したら reset_sec 秒間は呼び出しを止める（open）
+    経過後は1回だけ試し（half-open）、成功すれば再開、失敗すれば再び止める
+    """
+
+    def __init__(self, failure_threshold: int, reset_sec: float):
+        self.failure_threshold = failure_threshold
+        self.reset_sec = reset_sec
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_sec:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """呼び出して良いか判定する。half-open の試行を任された場合は True"""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial):
+            retry_after = self.opened_at + self.reset_sec - time.monotonic()
+            raise ExchangeUnavailable(max(retry_after, 1))
+        if state == "half_open":
+            self._trial = True
+            return True
+        return False
+
+    def end_trial(self):
+        self._trial = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class ExchangeClient:
+    """
+    ccxt の取引所クライアントをプロセス内で共有するためのラッパー
+    - レート制限（トークンバケット）・1回あたりのタイムアウト
+    - 通信エラー・タイムアウト時のみ指数バックオフで再試行
+    - サーキットブレーカー（取引所の障害中は待たずに ExchangeUnavailable）
+    - 同じ引数で実行中の fetch_ohlcv には相乗りする（single-flight）
+    """
+
+    # 再試行する例外（BadRequest などの ExchangeError は再試行しない）
+    RETRYABLE = (ccxt.NetworkError, asyncio.TimeoutError)
+
+    def __init__(
+        self,
+        exchange,
+        rate: float = 10,
+        burst: int = 10,
+        timeout: float = 10,
+        retries: int = 2,
+        backoff: float = 0.5,
+        failure_threshold: int = 5,
+        reset_sec: float = 30,
+    ):
+        self.exchange = exchange
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_sec)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._inflight: dict[tuple, asyncio.Future] = {}
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        key = (symbol, timeframe, since, limit)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(
+                self._fetch_ohlcv(symbol, timeframe, since, limit)
+            )
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        else:
+            metrics.EXCHANGE_COALESCED.inc()
+
+        # 相乗りした側がキャンセルされても、取得自体は続ける
+        return list(await asyncio.shield(future))
+
+    def _done(self, key, future):
+        self._inflight.pop(key, None)
+        # 待っている側が全てキャンセルされた場合の未取得の例外の警告を防ぐ
+        if not future.cancelled():
+            future.exception()
+
+    async def _fetch_ohlcv(self, symbol, timeframe, since, limit):
+        for attempt in range(self.retries + 1):
+            is_trial = self.breaker.before_call()
+            try:
+                await self.bucket.acquire()
+                ohlcv = await asyncio.wait_for(
+                    self.exchange.fetch_ohlcv(
+                        symbol, timeframe, since=since, limit=limit
+                    ),
+                    self.timeout,
+                )
+            except self.RETRYABLE:
+                self.breaker.record_failure()
+                metrics.EXCHANGE_CIRCUIT_OPEN.set(self.breaker.state != "closed")
+                if attempt == self.retries:
+                    raise
+                metrics.EXCHANGE_RETRIES.inc()
+                # backoff × 1, 2, 4 ... 秒（同時に再試行が集中しないよう揺らす）
+                await asyncio.sleep(self.backoff * 2**attempt * random.uniform(1, 1.5))
+                continue
+            except Exception:
+                # 取引所は応答している（引数の誤りなど）ため障害とはみなさない
+                self.breaker.record_success()
+                raise
+            finally:
+                # キャンセルなどで成否を記録せずに終わっても、以降の試行を止めない
+                if is_trial:
+                    self.breaker.end_trial()
+
+            self.breaker.record_success()
+            metrics.EXCHANGE_CIRCUIT_OPEN.set(0)
+            return ohlcv
+
+    async def close(self):
+        await self.exchange.close()
+
+
+def create(config) -> ExchangeClient:
+    """設定値から Binance のクライアントを作る（レート制限はこちらで行う）"""
+    exchange = ccxt.binance(
+        {"enableRateLimit": False, "timeout": int(config.exchange_timeout * 1000)}
+    )
+    return wrap(exchange, config)
+
+
+def wrap(exchange, config) -> ExchangeClient:
+    return ExchangeClient(
+        exchange,
+        rate=config.exchange_rate_per_sec,
+        burst=config.exchange_burst,
+        timeout=config.exchange_timeout,
+        retries=config.exchange_retries,
+        backoff=config.exchange_backoff_sec,
+        failure_threshold=config.exchange_breaker_failures,
+        reset_sec=config.exchange_breaker_reset_sec,
+    )
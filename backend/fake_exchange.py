@@ -0,0 +1,72 @@
+import asyncio
+import json
+import math
+import time
+
+import candles
+import exchange_client
+from config import settings
+
+HOUR_MS = candles.TIMEFRAME_MS["1h"]
+
+
+def synthetic_candle(timestamp: int) -> list[float]:
+    """timestamp から決まる疑似的な1時間足（同じ時刻なら常に同じ値）"""
+    t = timestamp / HOUR_MS
+    open_ = 60000 * (1 + 0.05 * math.sin(t / 97) + 0.01 * math.sin(t / 7))
+    t += 1
+    close = 60000 * (1 + 0.05 * math.sin(t / 97) + 0.01 * math.sin(t / 7))
+    return [
+        timestamp,
+        open_,
+        max(open_, close) * 1.001,
+        min(open_, close) * 0.999,
+        close,
+        100 + 50 * math.sin(t / 3),
+    ]
+
+
+class FakeExchange:
+    """
+    ccxtの取引所の代わりに記録済みのローソク足を返す（ベンチマーク・オフライン検証用）
+    記録に無い時刻は synthetic_candle で補う
+    """
+
+    def __init__(self, recorded: list[list[float]] | None = None, latency_ms=0):
+        self.recorded = {int(c[0]): c for c in recorded or []}
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    @classmethod
+    def load(cls, path: str, latency_ms=0):
+        with open(path) as f:
+            return cls(json.load(f), latency_ms=latency_ms)
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        step = candles.TIMEFRAME_MS[timeframe]
+        current = int(time.time() * 1000) // step * step
+        limit = limit or 500
+        since = current - (limit - 1) * step if since is None else since
+
+        start = -(-since // step) * step
+        ohlcv = []
+        for ts in range(start, current + 1, step):
+            if len(ohlcv) >= limit:
+                break
+            ohlcv.append(list(self.recorded.get(ts) or synthetic_candle(ts)))
+        return ohlcv
+
+    async def close(self):
+        pass
+
+
+def install(exchange):
+    """
+    candles モジュールが使う取引所クライアントを差し替える
+    （レート制限・再試行などは本番と同じ ExchangeClient を通す）
+    """
+    candles._exchange = exchange_client.wrap(exchange, settings)
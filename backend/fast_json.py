@@ -0,0 +1,45 @@
+import orjson
+from fastapi import Response
+
+# pydantic と同じく UTC の datetime は末尾を Z にする
+OPTIONS = orjson.OPT_UTC_Z
+
+
+class FastJSONResponse(Response):
+    """
+    response_model による検証を通さず、orjson でそのままエンコードするレスポンス
+    （settings.fast_json が有効な場合に使う。中身は response_model と同じ形にすること）
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=OPTIONS)
+
+
+def win_rate(wins: int, total_rounds: int) -> float:
+    return wins / total_rounds if total_rounds > 0 else 0.0
+
+
+def leaderboard(rows) -> FastJSONResponse:
+    """(rank, username, total_rounds, wins, points) の行から LeaderBoardItem の一覧"""
+    return FastJSONResponse(
+        [
+            {
+                "rank": rank,
+                "username": username,
+                "points": points,
+                "total_rounds": total_rounds,
+                "wins": wins,
+                "win_rate": win_rate(wins, total_rounds),
+            }
+            for rank, username, total_rounds, wins, points in rows
+        ]
+    )
+
+
+def game_round_page(rows, next_cursor: int | None) -> FastJSONResponse:
+    """GameRoundSummary の列を select した行から GameRoundPage"""
+    return FastJSONResponse(
+        {"items": [row._asdict() for row in rows], "next_cursor": next_cursor}
+    )
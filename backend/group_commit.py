@@ -0,0 +1,88 @@
+import asyncio
+import contextvars
+import uuid
+
+import database
+import models
+import predictions
+from fastapi import HTTPException
+from predictions import PredictionResult
+
+
+class PredictionBatcher:
+    """
+    短時間に届いた予想登録をまとめて1トランザクションで書き込み、
+    各リクエストにはそれぞれの結果を返す（件ごとの失敗は他に影響しない）
+    """
+
+    def __init__(self, window_ms: float, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: list[tuple[tuple, asyncio.Future]] = []
+        self._timer: asyncio.Task | None = None
+        self._flushing: set[asyncio.Task] = set()
+
+    async def submit(
+        self,
+        game_round_id: int,
+        user_uid: uuid.UUID,
+        choice: models.PredictionChoice,
+    ) -> PredictionResult:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((game_round_id, user_uid, choice), future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            # 最初のリクエストのコンテキスト（SQL集計など）を引き継がない
+            self._timer = asyncio.create_task(
+                self._flush_later(), context=contextvars.Context()
+            )
+
+        return await future
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._flush(batch), context=contextvars.Context())
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        batch, self._pending = self._pending, []
+        await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[tuple, asyncio.Future]]):
+        if not batch:
+            return
+
+        try:
+            async with database.open_session() as db:
+                try:
+                    results = await predictions.upsert_predictions(
+                        db, [item for item, _ in batch]
+                    )
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+        except Exception as e:
+            error = HTTPException(status_code=500, detail=f"DB更新失敗: {e}")
+            results = [error] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, PredictionResult):
+                predictions.on_committed(result)
+
+            # 切断などで待機がキャンセルされている場合
+            if future.done():
+                continue
+
+            if isinstance(result, HTTPException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -1,16 +1,48 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-
-import ccxt
+from typing import Literal
+from uuid import UUID
+
+import candles
+import charts
+import database
+import exchange_client
+import fast_json
+import metrics
 import models
+import numpy as np
+import predictions
+import query_stats
 import schemas
-from database import get_db
-from fastapi import Depends, FastAPI, HTTPException
+import settlement
+from broadcaster import Event, broadcaster
+from compression import CompressionMiddleware
+from config import settings
+from database import engine, get_db
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import case, func, select
+from fastapi.responses import StreamingResponse
+from group_commit import PredictionBatcher
+from ranking import rank_index
+from round_cache import active_round_cache
+from sqlalchemy import func, select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, selectinload
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.warm_up()
+    print(f"DBプール準備完了: {database.pool_status()}")
+    yield
+    await candles.close_exchange()
+    await database.engine.dispose()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # 許可するオリジン（フロントエンドのURL）
 origins = [
@@ -24,33 +56,99 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Query-Count", "X-DB-Time-Ms", "Server-Timing", "ETag"],
+)
+
+if settings.query_stats:
+    query_stats.install(engine.sync_engine)
+    app.middleware("http")(query_stats.middleware)
+
+if settings.compression_min_size > 0:
+    app.add_middleware(
+        CompressionMiddleware, minimum_size=settings.compression_min_size
+    )
+
+# 圧縮・SQL計測も含めた処理時間を計測するため最後（最も外側）に登録する
+if settings.metrics:
+    query_stats.install(engine.sync_engine, observe=metrics.DB_QUERY_DURATION.observe)
+    app.middleware("http")(metrics.middleware)
+
+# SSE接続維持のためのコメント送信間隔
+SSE_KEEPALIVE_SEC = 15
+
+prediction_batcher = None
+if settings.prediction_group_commit_ms > 0:
+    prediction_batcher = PredictionBatcher(
+        settings.prediction_group_commit_ms, settings.prediction_group_commit_max
+    )
+
+# ラウンド取得時のロード方針（予想・ユーザーは selectinload で一括取得）
+ROUND_WITH_PREDICTIONS = selectinload(models.GameRound.predictions).selectinload(
+    models.Prediction.user
 )
 
+# ラウンドのレスポンスにはチャートを含めない（/game_rounds/{id}/chart で取得する）
+WITHOUT_CHART = defer(models.GameRound.chart_data)
+
+# 確定済みラウンドのチャートは変化しないため長期キャッシュさせる
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# /prices で一度に扱うローソク足の上限（これより長い期間は timeframe を大きくする）
+MAX_HISTORY_CANDLES = 10000
+
+
+def exchange_error(e: Exception) -> HTTPException:
+    """取引所からの取得失敗のレスポンス（障害で問い合わせを止めている間は503）"""
+    if isinstance(e, exchange_client.ExchangeUnavailable):
+        return HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": f"{e.retry_after:.0f}"},
+        )
+    return HTTPException(status_code=500, detail=f"Binance API接続エラー: {e}")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    if not settings.metrics:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return metrics.render()
+
+
+@app.get("/debug/pool", include_in_schema=False)
+async def get_pool_status():
+    # SQLの計測と同じく開発時のみ公開する
+    if not settings.query_stats:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return database.pool_status()
+
 
 @app.post("/users", response_model=schemas.UserCreateResponse)
-def create_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     new_user = models.User(name=user_in.name)
     db.add(new_user)
 
     try:
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
     except IntegrityError:
         # Unique制約違反（名前の重複）が起きた場合の処理
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=409, detail="この名前は既に登録されています")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"予期せぬエラー: {e}")
         raise HTTPException(status_code=500, detail="予期せぬエラーが発生しました")
 
+    rank_index.add(new_user.uid, new_user.points)
+
     return new_user
 
 
 @app.delete("/users", response_model=schemas.UserDeleteResponse)
-def delete_user(user_in: schemas.UserDelete, db: Session = Depends(get_db)):
+async def delete_user(user_in: schemas.UserDelete, db: AsyncSession = Depends(get_db)):
     stmt = select(models.User).where(models.User.uid == user_in.uid)
-    user = db.scalar(stmt)
+    user = await db.scalar(stmt)
 
     # ユーザー未存在エラー
     if not user or user.status == "deleted":
@@ -60,20 +158,25 @@ def delete_user(user_in: schemas.UserDelete, db: Session = Depends(get_db)):
     try:
         user.name = f"del_{user.uid.hex}"
         user.status = "deleted"
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"予期せぬエラー: {e}")
         raise HTTPException(status_code=500, detail="予期せぬエラーが発生しました")
 
+    # 参加者一覧に表示される名前が変わるため
+    active_round_cache.invalidate()
+
     return user
 
 
 @app.post("/users/me", response_model=schemas.UserMini)
-def get_current_user(data: schemas.UserLookup, db: Session = Depends(get_db)):
+async def get_current_user(
+    data: schemas.UserLookup, db: AsyncSession = Depends(get_db)
+):
     stmt = select(models.User).where(models.User.uid == data.uid)
-    user = db.scalar(stmt)
+    user = await db.scalar(stmt)
 
     if not user or user.status == "deleted":
         raise HTTPException(status_code=404, detail="ユーザーが存在しません")
@@ -81,16 +184,115 @@ def get_current_user(data: schemas.UserLookup, db: Session = Depends(get_db)):
     return user
 
 
-@app.get("/game_rounds", response_model=list[schemas.GameRoundResponse])
-def get_game_rounds(db: Session = Depends(get_db)):
-    stmt = select(models.GameRound).order_by(models.GameRound.id)
-    game_round = db.scalars(stmt)
+@app.get("/candles", response_model=list[schemas.Ohlcv])
+async def get_candles(
+    since: int = Query(..., description="取得開始時刻（UNIXミリ秒）"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        ohlcv = await candles.fetch_ohlcv(db, since=since, limit=limit)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise exchange_error(e)
 
-    return game_round
+    return ohlcv
+
+
+@app.get("/prices", response_model=schemas.ChartResponse)
+async def get_price_history(
+    request: Request,
+    start: int = Query(..., description="開始時刻（UNIXミリ秒）"),
+    end: int | None = Query(None, description="終了時刻（UNIXミリ秒）。省略時は現在"),
+    points: int = Query(500, ge=3, le=2000, description="返す点数の上限"),
+    timeframe: Literal["1h", "4h", "1d"] = Query(candles.TIMEFRAME),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    BTC/USDT の終値の推移を、保存済みのローソク足から points 点以下に間引いて返す
+    形式は /game_rounds/{id}/chart と同じ（全ての点が before）
+    """
+    step = candles.TIMEFRAME_MS[timeframe]
+    now = int(datetime.now(timezone.utc).timestamp() * 1000)
+    end = now if end is None else min(end, now)
+
+    if start > end:
+        raise HTTPException(
+            status_code=400, detail="start は end 以前を指定してください"
+        )
+
+    count = (end - start) // step + 1
+    if count > MAX_HISTORY_CANDLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"期間が長すぎます（{timeframe}足で{MAX_HISTORY_CANDLES}本まで）",
+        )
+
+    try:
+        ohlcv = await candles.fetch_ohlcv(
+            db, since=start, limit=count, timeframe=timeframe
+        )
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise exchange_error(e)
+
+    ohlcv = [c for c in ohlcv if c[0] <= end]
+    timestamps = np.array([c[0] for c in ohlcv], dtype=np.int64)
+    closes = np.array([c[4] for c in ohlcv], dtype=np.float64)
+    picked = charts.lttb(timestamps, closes, points)
+
+    chart = charts.encode(
+        [(int(timestamps[i]), float(closes[i])) for i in picked], [], timeframe
+    )
+    body, etag = charts.serialize(chart)
+
+    # 確定済みの足だけで構成される期間は内容が変わらない
+    is_closed = end < now // step * step
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_closed else "no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/game_rounds", response_model=schemas.GameRoundPage)
+async def get_game_rounds(
+    cursor: int | None = Query(None, description="前ページ最後のラウンドID"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    # 新しい順にキーセットページング（chart_data・予想一覧は取得しない）
+    stmt = select(
+        models.GameRound.id,
+        models.GameRound.start_at,
+        models.GameRound.closed_at,
+        models.GameRound.target_at,
+        models.GameRound.base_price,
+        models.GameRound.result_price,
+        models.GameRound.winning_choice,
+    ).order_by(models.GameRound.id.desc())
+
+    if cursor is not None:
+        stmt = stmt.where(models.GameRound.id < cursor)
+
+    # 次ページ有無の判定のため1件多く取得する
+    rows = (await db.execute(stmt.limit(limit + 1))).all()
+
+    items = rows[:limit]
+    next_cursor = items[-1].id if len(rows) > limit else None
+
+    if settings.fast_json:
+        return fast_json.game_round_page(items, next_cursor)
+
+    return {"items": items, "next_cursor": next_cursor}
 
 
 @app.post("/game_rounds", response_model=schemas.GameRoundResponse)
-def create_game_round(db: Session = Depends(get_db)):
+async def create_game_round(db: AsyncSession = Depends(get_db)):
     # ラウンドの開始時刻
     start_at = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
 
@@ -99,27 +301,25 @@ def create_game_round(db: Session = Depends(get_db)):
 
     # ラウンド存在チェック
     stmt = select(models.GameRound).where(models.GameRound.start_at == start_at)
-    if db.scalar(stmt):
+    if await db.scalar(stmt):
         raise HTTPException(
             status_code=409, detail="このゲームラウンドは既に存在します"
         )
 
     # binanceの価格を取得
     try:
-        exchange = ccxt.binance({"enableRateLimit": True})
-        symbol = "BTC/USDT"
-        timeframe = "1h"
         since = int(chart_start_at.timestamp() * 1000)
-        ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=50)
+        ohlcv = await candles.fetch_ohlcv(db, since=since, limit=50)
 
         if not ohlcv:
             raise HTTPException(status_code=404, detail="価格データ取得エラー")
 
         base_price = float(ohlcv[-1][1])  # [1]:open
-        chart_data = {"before": [(item[0], item[1]) for item in ohlcv], "after": []}
+        chart_data = charts.encode([(item[0], item[1]) for item in ohlcv], [])
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Binance API接続エラー: {e}")
+        await db.rollback()
+        raise exchange_error(e)
 
     # DB追加
     new_round = models.GameRound(
@@ -128,288 +328,458 @@ def create_game_round(db: Session = Depends(get_db)):
         target_at=start_at + timedelta(hours=4),
         base_price=base_price,
         chart_data=chart_data,
+        predictions=[],
     )
 
     try:
         db.add(new_round)
-        db.commit()
-        db.refresh(new_round)
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"DB保存失敗: {e}")
 
-    return new_round
-
-
-def settle_round(
-    round: models.GameRound,
-    result_price: float,
-    chart_data_after: list[models.PriceAtTime],
-):
-    """
-    1つのラウンドに対して、勝敗判定とポイント分配を行う
-    """
-    # ゲームラウンドに正解をセットする
-    round.result_price = result_price
-
-    # チャートデータを追加する
-    round.chart_data = {
-        "before": round.chart_data.get("before", []),
-        "after": chart_data_after,
-    }
-
-    diff_pct = (round.result_price - round.base_price) / round.base_price
-    if diff_pct <= -0.003:
-        round.winning_choice = models.PredictionChoice.BEARISH
-    elif diff_pct >= 0.003:
-        round.winning_choice = models.PredictionChoice.BULLISH
-    else:
-        round.winning_choice = models.PredictionChoice.NEUTRAL
-
-    # ポイント計算・配布
-    num_participants = len(round.predictions)
-
-    if num_participants > 0:
-        total_pool = num_participants * 100 * 2  # 参加人数 * 100pt * 2(ボーナス)
-
-        win_predictions = [
-            p for p in round.predictions if p.choice == round.winning_choice
-        ]
+    active_round_cache.invalidate()
 
-        if win_predictions:
-            share = total_pool // len(win_predictions)
-
-        # ユーザーの所持ポイント、予想データのポイントを更新
-        for p in round.predictions:
-            if p.choice == round.winning_choice:
-                p.is_won = True
-                p.earned_points = share
-                p.user.points += share
-            else:
-                p.is_won = False
+    return new_round
 
 
 @app.post("/game_rounds/settle")
-def settle_game_rounds(db: Session = Depends(get_db)):
+async def settle_game_rounds(db: AsyncSession = Depends(get_db)):
+    started = time.perf_counter()
+
     # 正解が登録されていないゲームラウンドを取得
     now = datetime.now(timezone.utc)
 
     stmt = (
         select(models.GameRound)
-        .options(
-            selectinload(models.GameRound.predictions).selectinload(
-                models.Prediction.user
-            )
-        )
         .where(models.GameRound.target_at <= now)
         .where(models.GameRound.result_price.is_(None))
     )
-    game_rounds = db.scalars(stmt).all()
+    # ORMモードのみ予想をロードする（ユーザーのポイントはUPDATE文で加算する）
+    if settings.settlement_mode == "orm":
+        stmt = stmt.options(selectinload(models.GameRound.predictions))
+    game_rounds = (await db.scalars(stmt)).all()
 
     if not game_rounds:
+        metrics.SETTLEMENT_ROUNDS.observe(0)
         return {"message": "現在、判定待ちのラウンドはありません。"}
 
-    exchange = ccxt.binance({"enableRateLimit": True})
-    symbol = "BTC/USDT"
-    timeframe = "1h"
+    # 判定待ちラウンドが必要とする区間を、連続する区間ごとにまとめて取得する
+    # （各ラウンドは判定時刻3時間前からの3本を使用。足が揃わず残ったラウンドが
+    #  あっても、その間の期間まで読み直さないよう離れた区間は分けて取得する）
+    step = candles.TIMEFRAME_MS[candles.TIMEFRAME]
+    since_list = [
+        int((round.target_at - timedelta(hours=3)).timestamp() * 1000)
+        for round in game_rounds
+    ]
 
-    settled_ids = []
-    for round in game_rounds:
-        try:
-            # 判定時刻3時間前からローソク取得し、open × 3 と 最後のcloseを使用。
-            since_dt = round.target_at - timedelta(hours=3)
-            since = int(since_dt.timestamp() * 1000)
+    ohlcv_by_ts = {}
+    try:
+        for since, limit in candles.group_windows(since_list, 3, step):
+            for item in await candles.fetch_ohlcv(db, since=since, limit=limit):
+                ohlcv_by_ts[item[0]] = item
+    except Exception as e:
+        await db.rollback()
+        raise exchange_error(e)
 
-            ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=3)
+    fallback_before = now - timedelta(hours=settings.settle_fallback_hours)
 
-            if not ohlcv:
-                continue
+    settled_ids = []
+    unresolved_ids = []
+    try:
+        for round, round_since in zip(game_rounds, since_list):
+            # open × 3 と 最後のcloseを使用。揃っていなければ次回に持ち越す
+            ohlcv = [ohlcv_by_ts.get(round_since + step * i) for i in range(3)]
+            if None in ohlcv:
+                if round.target_at > fallback_before:
+                    continue
+
+                # 期限を過ぎても揃わない場合は、取得できた足だけで判定する
+                ohlcv = [item for item in ohlcv if item is not None]
+                if not ohlcv:
+                    print(f"ラウンド #{round.id}: 判定に使えるローソク足がありません")
+                    unresolved_ids.append(round.id)
+                    continue
+                print(
+                    f"ラウンド #{round.id}: ローソク足が揃わないため"
+                    f"{len(ohlcv)}本で判定"
+                )
 
             result_price = ohlcv[-1][4]  # close
             chart_data_after = [(item[0], item[1]) for item in ohlcv]
-            last_timestamp = ohlcv[-1][0] + (1000 * 60 * 60)
+            last_timestamp = ohlcv[-1][0] + step
             chart_data_after.append(
                 (
                     last_timestamp,
                     result_price,
                 )
             )
-            settle_round(round, result_price, chart_data_after)
-
-            # データ更新
-            db.commit()
+            if settings.settlement_mode == "orm":
+                await settlement.settle_round(db, round, result_price, chart_data_after)
+            else:
+                await settlement.settle_round_bulk(
+                    db, round, result_price, chart_data_after
+                )
             settled_ids.append(round.id)
 
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(status_code=500, detail=f"異常終了: {e}")
+        # データ更新
+        await db.commit()
+
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"異常終了: {e}")
+
+    metrics.SETTLEMENT_ROUNDS.observe(len(settled_ids))
+    metrics.SETTLEMENT_DURATION.observe(time.perf_counter() - started)
+
+    # ポイントが一斉に変動するため順位インデックス・キャッシュを作り直す
+    rank_index.invalidate()
+    active_round_cache.invalidate()
+
+    for round in game_rounds:
+        if round.id in settled_ids:
+            broadcaster.publish(round.id, "settled", settled_event_data(round))
 
     return {
         "message": f"{len(settled_ids)}件のラウンドを確定",
         "settled_ids": settled_ids,
+        # 期限を過ぎても価格が全く取得できず、判定できなかったラウンド
+        "unresolved_ids": unresolved_ids,
+    }
+
+
+def settled_event_data(round: models.GameRound) -> dict:
+    """SSEの settled イベントの内容（結果とチャート）"""
+    return {
+        "id": round.id,
+        "result_price": round.result_price,
+        "winning_choice": round.winning_choice,
+        "chart": round.chart_data,
     }
 
 
 @app.get("/game_rounds/active", response_model=schemas.GameRoundResponse | None)
-def get_active_game_round(db: Session = Depends(get_db)):
-    # 現在有効なゲームラウンドを取得
-    now = datetime.now(timezone.utc)
+async def get_active_game_round(request: Request):
+    # キャッシュがあればDBに問い合わせない
+    cached = active_round_cache.get()
+
+    if cached is None:
+        version = active_round_cache.version
+
+        # 現在有効なゲームラウンドを取得
+        now = datetime.now(timezone.utc)
+        stmt = (
+            select(models.GameRound)
+            .options(ROUND_WITH_PREDICTIONS, WITHOUT_CHART)
+            .where(models.GameRound.start_at <= now)
+            .where(models.GameRound.closed_at > now)
+            .order_by(models.GameRound.start_at.desc())
+            .limit(1)
+        )
+
+        async with database.open_session() as db:
+            game_round = await db.scalar(stmt)
+
+        if game_round:
+            body = schemas.GameRoundResponse.model_validate(game_round)
+            cached = active_round_cache.set(
+                body.model_dump_json().encode(), game_round.closed_at, version
+            )
+        else:
+            cached = active_round_cache.set(b"null", None, version)
+
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+
+    if request.headers.get("if-none-match") == cached.etag:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+@app.get("/game_rounds/{game_round_id}", response_model=schemas.GameRoundResponse)
+async def get_game_round(game_round_id: int, db: AsyncSession = Depends(get_db)):
     stmt = (
         select(models.GameRound)
-        .where(models.GameRound.start_at <= now)
-        .where(models.GameRound.closed_at > now)
-        .order_by(models.GameRound.start_at.desc())
-        .limit(1)
-    ).options(
-        joinedload(models.GameRound.predictions).joinedload(models.Prediction.user)
+        .options(ROUND_WITH_PREDICTIONS, WITHOUT_CHART)
+        .where(models.GameRound.id == game_round_id)
     )
+    game_round = await db.scalar(stmt)
+
+    if not game_round:
+        raise HTTPException(
+            status_code=404, detail=f"ラウンド #{game_round_id} は存在しません"
+        )
 
-    game_round = db.scalars(stmt).first()
     return game_round
 
 
-@app.get("/game_rounds/{game_round_id}", response_model=schemas.GameRoundResponse)
-def get_game_round(game_round_id: int, db: Session = Depends(get_db)):
-    stmt = select(models.GameRound).where(models.GameRound.id == game_round_id)
-    game_round = db.scalar(stmt)
+@app.get("/game_rounds/{game_round_id}/chart", response_model=schemas.ChartResponse)
+async def get_game_round_chart(
+    game_round_id: int, request: Request, db: AsyncSession = Depends(get_db)
+):
+    stmt = select(models.GameRound.chart_data, models.GameRound.result_price).where(
+        models.GameRound.id == game_round_id
+    )
+    row = (await db.execute(stmt)).first()
+
+    if not row:
+        raise HTTPException(
+            status_code=404, detail=f"ラウンド #{game_round_id} は存在しません"
+        )
+
+    body, etag = charts.serialize(row.chart_data)
+
+    # 確定前は判定時の価格が追加されるため、毎回ETagで再検証させる
+    is_settled = row.result_price is not None
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_settled else "no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/game_rounds/{game_round_id}/events")
+async def stream_game_round_events(game_round_id: int, request: Request):
+    """
+    ラウンドの更新をServer-Sent Eventsで配信する
+    prediction: 参加・予想変更 / closed: 締切 / settled: 確定（結果とチャート）
+    """
+    async with database.open_session() as db:
+        game_round = await db.get(models.GameRound, game_round_id)
 
     if not game_round:
         raise HTTPException(
             status_code=404, detail=f"ラウンド #{game_round_id} は存在しません"
         )
 
-    return game_round
+    closed_at = game_round.closed_at
+
+    async def event_stream():
+        with broadcaster.subscribe(game_round_id) as queue:
+            # 確定済みなら結果を1回送って終える（クライアントは settled で接続を閉じる）
+            # 読み込みから購読までの間に確定した場合は配信を受け取れないため読み直す
+            settled_round = game_round if game_round.result_price is not None else None
+            if settled_round is None:
+                async with database.open_session() as db:
+                    stmt = select(models.GameRound.result_price).where(
+                        models.GameRound.id == game_round_id
+                    )
+                    if await db.scalar(stmt) is not None:
+                        settled_round = await db.get(models.GameRound, game_round_id)
+            if settled_round is not None:
+                yield Event(
+                    name="settled", data=settled_event_data(settled_round)
+                ).encode()
+                return
+
+            is_closed = datetime.now(timezone.utc) >= closed_at
+
+            while not await request.is_disconnected():
+                timeout = SSE_KEEPALIVE_SEC
+                if not is_closed:
+                    until_closed = (
+                        closed_at - datetime.now(timezone.utc)
+                    ).total_seconds()
+                    timeout = max(0, min(timeout, until_closed))
+
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    if not is_closed and datetime.now(timezone.utc) >= closed_at:
+                        is_closed = True
+                        yield Event(name="closed", data={"id": game_round_id}).encode()
+                    else:
+                        yield ": keepalive\n\n"
+                    continue
+
+                # 配信が追いつかず打ち切られた場合
+                if event is None:
+                    break
+
+                yield event.encode()
+
+                if event.name == "settled":
+                    break
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post(
     "/game_rounds/{game_round_id}/predictions",
     response_model=schemas.PredictionCreateResponse,
 )
-def create_prediction(
+async def create_prediction(
     game_round_id: int,
     prediction_in: schemas.PredictionCreate,
-    db: Session = Depends(get_db),
 ):
-    # ゲームラウンドの存在・終了時刻確認
-    stmt = select(models.GameRound).where(models.GameRound.id == game_round_id)
-    game_round = db.scalar(stmt)
-
-    if not game_round:
-        raise HTTPException(
-            status_code=404, detail="指定されたゲームラウンドは存在しません"
+    # グループコミット有効時は他のリクエストとまとめて書き込む
+    if prediction_batcher is not None:
+        return await prediction_batcher.submit(
+            game_round_id, prediction_in.user_uid, prediction_in.choice
         )
 
-    if datetime.now(timezone.utc) >= game_round.closed_at:
-        raise HTTPException(
-            status_code=400, detail="このラウンドはすでに締め切られています"
-        )
+    async with database.open_session() as db:
+        try:
+            result = await predictions.upsert_prediction(
+                db, game_round_id, prediction_in.user_uid, prediction_in.choice
+            )
+            await db.commit()
+        except HTTPException:
+            await db.rollback()
+            raise
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"DB更新失敗: {e}")
 
-    # ユーザーの取得
-    stmt = select(models.User).where(models.User.uid == prediction_in.user_uid)
-    user = db.scalar(stmt)
+    predictions.on_committed(result)
 
-    if not user:
-        raise HTTPException(status_code=404, detail="ユーザーが存在しません")
+    return result
 
-    # 登録済の予測があるか確認
-    stmt = (
-        select(models.Prediction)
-        .where(models.Prediction.user_uid == prediction_in.user_uid)
-        .where(models.Prediction.game_round_id == game_round_id)
-    )
-    prediction = db.scalar(stmt)
 
-    if prediction:
-        prediction.choice = prediction_in.choice
-    else:
-        # ポイントが不足している場合は参加不可
-        if user.points < 100:
-            raise HTTPException(status_code=400, detail="ポイントが不足しています")
-
-        prediction = models.Prediction(
-            user_uid=prediction_in.user_uid,
-            game_round_id=game_round_id,
-            choice=prediction_in.choice,
-        )
-        db.add(prediction)
-        user.points -= 100
+@app.post(
+    "/game_rounds/{game_round_id}/predictions/batch",
+    response_model=list[schemas.PredictionBatchItemResult],
+)
+async def create_predictions_batch(
+    game_round_id: int,
+    batch_in: schemas.PredictionBatchCreate,
+    db: AsyncSession = Depends(get_db),
+):
+    # AIユーザーなど複数件の予想をまとめて登録する（件ごとに結果を返す）
+    items = [(game_round_id, p.user_uid, p.choice) for p in batch_in.items]
 
     try:
-        db.commit()
-        db.refresh(prediction)
-        db.refresh(user)
+        results = await predictions.upsert_predictions(db, items)
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"DB更新失敗: {e}")
 
-    print(prediction.__dict__)
-    return prediction
+    response = []
+    for item, result in zip(batch_in.items, results):
+        if isinstance(result, HTTPException):
+            response.append(
+                {
+                    "user_uid": item.user_uid,
+                    "status_code": result.status_code,
+                    "detail": result.detail,
+                }
+            )
+        else:
+            predictions.on_committed(result)
+            response.append(
+                {"user_uid": item.user_uid, "status_code": 200, "prediction": result}
+            )
+
+    return response
 
 
 @app.get("/leaderboard", response_model=list[schemas.LeaderBoardItem])
-def get_leaderboard(db: Session = Depends(get_db)):
+async def get_leaderboard(
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    # users.points のインデックス順に上位N件のみ読む
     stmt = (
         select(
             func.rank().over(order_by=models.User.points.desc()).label("rank"),
             models.User.name.label("username"),
-            func.count(models.Prediction.id).label("rounds"),
-            func.sum(case((models.Prediction.is_won, 1), else_=0)).label("wins"),
-            models.User.points.label("points"),
+            models.User.total_rounds,
+            models.User.wins,
+            models.User.points,
         )
-        .outerjoin(models.Prediction, models.User.uid == models.Prediction.user_uid)
-        .group_by(models.User.uid)
         .order_by(models.User.points.desc())
+        .limit(limit)
+        .offset(offset)
     )
 
-    data = db.execute(stmt).all()
+    data = (await db.execute(stmt)).all()
 
     if not data:
         raise HTTPException(status_code=404, detail="データが取得できませんでした")
 
+    if settings.fast_json:
+        return fast_json.leaderboard(data)
+
     results = []
 
-    for i, d in enumerate(data):
+    for d in data:
         results.append(
             {
                 "rank": d.rank,
                 "username": d.username,
                 "points": d.points,
-                "total_rounds": d.rounds,
+                "total_rounds": d.total_rounds,
                 "wins": d.wins,
-                "win_rate": d.wins / d.rounds if d.rounds > 0 else 0,
+                "win_rate": d.wins / d.total_rounds if d.total_rounds > 0 else 0,
             }
         )
 
     return results
 
 
-@app.get("/leaderboard/me", response_model=schemas.LeaderBoardItem)
-def get_user_leaderboard_item(username: str, db: Session = Depends(get_db)):
-    stmt = (
-        select(
-            models.User.name.label("username"),
-            func.count(models.Prediction.id).label("rounds"),
-            func.sum(case((models.Prediction.is_won, 1), else_=0)).label("wins"),
-            models.User.points.label("points"),
-        )
-        .outerjoin(models.Prediction, models.User.uid == models.Prediction.user_uid)
-        .where(models.User.name == username)
-        .group_by(models.User.uid)
-    )
+def to_leaderboard_item(user: models.User, rank: int) -> dict:
+    return {
+        "rank": rank,
+        "username": user.name,
+        "points": user.points,
+        "total_rounds": user.total_rounds,
+        "wins": user.wins,
+        "win_rate": user.wins / user.total_rounds if user.total_rounds > 0 else 0,
+    }
+
+
+@app.get("/leaderboard/me", response_model=schemas.LeaderBoardMe)
+async def get_user_leaderboard_item(
+    uid: UUID | None = None,
+    username: str | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    if uid is not None:
+        stmt = select(models.User).where(models.User.uid == uid)
+    elif username is not None:
+        stmt = select(models.User).where(models.User.name == username)
+    else:
+        raise HTTPException(status_code=400, detail="uidを指定してください")
 
-    me = db.execute(stmt).first()
+    me = await db.scalar(stmt)
 
     if not me:
         raise HTTPException(status_code=404, detail="データを取得できませんでした")
 
-    stmt = select(func.count(models.User.uid)).where(models.User.points > me.points)
-    higher_users_count = db.scalar(stmt)
+    await rank_index.ensure()
+
+    # 前後のユーザー（users.points のインデックスで1件ずつ取得）
+    stmt = (
+        select(models.User)
+        .where(models.User.points > me.points)
+        .order_by(models.User.points.asc())
+        .limit(1)
+    )
+    above = await db.scalar(stmt)
+
+    stmt = (
+        select(models.User)
+        .where(models.User.points < me.points)
+        .order_by(models.User.points.desc())
+        .limit(1)
+    )
+    below = await db.scalar(stmt)
 
     return {
-        "rank": higher_users_count + 1,
-        "username": me.username,
-        "points": me.points,
-        "total_rounds": me.rounds,
-        "wins": me.wins,
-        "win_rate": me.wins / me.rounds if me.rounds > 0 else 0,
+        **to_leaderboard_item(me, rank_index.rank(me.points)),
+        "percentile": rank_index.percentile(me.points),
+        "above": (
+            to_leaderboard_item(above, rank_index.rank(above.points)) if above else None
+        ),
+        "below": (
+            to_leaderboard_item(below, rank_index.rank(below.points)) if below else None
+        ),
     }
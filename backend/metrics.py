@@ -0,0 +1,102 @@
+import time
+
+import database
+from fastapi import Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# gunicorn は1ワーカーで動かすため、プロセス内のレジストリをそのまま公開する
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "リクエストの処理時間（SSEはレスポンス開始まで）",
+    ["method", "route", "status"],
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "SQL1回あたりの実行時間（計測は query_stats のイベントで行う）",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "コネクションプールの状態", ["state"]
+)
+DB_POOL_CHECKOUT_MAX = Gauge(
+    "db_pool_checkout_max_seconds", "コネクション取得待ち時間の最大値"
+)
+
+EXCHANGE_DURATION = Histogram(
+    "exchange_fetch_ohlcv_duration_seconds",
+    "取引所の fetch_ohlcv 1回あたりの所要時間",
+    ["timeframe"],
+)
+EXCHANGE_ERRORS = Counter(
+    "exchange_fetch_ohlcv_errors_total",
+    "取引所の fetch_ohlcv の失敗回数",
+    ["timeframe", "error"],
+)
+
+EXCHANGE_RETRIES = Counter("exchange_retries_total", "取引所への問い合わせの再試行回数")
+EXCHANGE_COALESCED = Counter(
+    "exchange_coalesced_total",
+    "実行中の同じ fetch_ohlcv に相乗りした回数",
+)
+EXCHANGE_CIRCUIT_OPEN = Gauge(
+    "exchange_circuit_open", "取引所のサーキットブレーカーが開いているか（1=開）"
+)
+
+SETTLEMENT_DURATION = Histogram(
+    "settlement_duration_seconds",
+    "/game_rounds/settle 1回の所要時間（ローソク足取得・commitを含む）",
+)
+SETTLEMENT_ROUNDS = Histogram(
+    "settlement_batch_rounds",
+    "/game_rounds/settle 1回で確定したラウンド数",
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+
+# ラウンド毎の件数は時間窓で求める（ラウンドIDをラベルにすると系列が増え続けるため）
+# 例: increase(predictions_submitted_total[1h])
+PREDICTIONS = Counter(
+    "predictions_submitted_total",
+    "登録された予想の件数（kind: new=新規参加 / changed=予想変更）",
+    ["kind"],
+)
+
+
+async def middleware(request: Request, call_next):
+    """ルート（パスのテンプレート）・ステータス毎のリクエスト処理時間を記録する"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # 存在しないパスでラベルが増え続けないよう、ルート外はまとめる
+        route = request.scope.get("route")
+        REQUEST_DURATION.labels(
+            request.method, route.path if route else "unmatched", str(status)
+        ).observe(time.perf_counter() - started)
+
+
+def observe_exchange(timeframe: str, started: float, error: Exception | None = None):
+    EXCHANGE_DURATION.labels(timeframe).observe(time.perf_counter() - started)
+    if error is not None:
+        EXCHANGE_ERRORS.labels(timeframe, type(error).__name__).inc()
+
+
+def render() -> Response:
+    """/metrics のレスポンス（プールの状態は取得時点の値）"""
+    status = database.pool_status()
+    for state in ("size", "checked_in", "checked_out", "overflow"):
+        DB_POOL_CONNECTIONS.labels(state).set(status[state])
+    DB_POOL_CHECKOUT_MAX.set(status["checkout"]["max_ms"] / 1000)
+
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -3,9 +3,20 @@ import uuid
 from datetime import datetime
 from typing import Tuple
 
-from sqlalchemy import JSON, Boolean, DateTime, Float, ForeignKey, Integer, String, func
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    String,
+    UniqueConstraint,
+    func,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from typing_extensions import TypedDict
+from typing_extensions import NotRequired, TypedDict
 
 
 class Base(DeclarativeBase):
@@ -24,7 +35,10 @@ class User(Base):
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
     is_ai: Mapped[bool] = mapped_column(default=False)
     status: Mapped[str] = mapped_column(default="active", nullable=False)
-    points: Mapped[int] = mapped_column(default=1000, nullable=False)
+    points: Mapped[int] = mapped_column(default=1000, nullable=False, index=True)
+    # リーダーボード用の集計値（予想登録・ラウンド確定時に更新）
+    total_rounds: Mapped[int] = mapped_column(default=0, nullable=False)
+    wins: Mapped[int] = mapped_column(default=0, nullable=False)
 
     def __repr__(self) -> str:
         return f"User(uid={self.uid!r}, name={self.name!r}, is_ai={self.is_ai!r})"
@@ -41,8 +55,18 @@ PriceAtTime = Tuple[int, float]  # (timestamp, close_price)
 
 
 class ChartData(TypedDict):
-    before: list[PriceAtTime]
-    after: list[PriceAtTime]
+    """
+    チャートの圧縮形式（charts.encode / charts.decode で変換する）
+    時刻は start + step * i、価格は scale 倍した整数の差分列（先頭は値そのもの）
+    先頭 before 件がラウンド開始時刻までの価格、残りが判定時の価格
+    """
+
+    start: int
+    step: int
+    scale: int
+    prices: list[int]
+    before: int
+    offsets: NotRequired[list[int]]  # 等間隔でない場合の各点の step 数
 
 
 class GameRound(Base):
@@ -65,11 +89,14 @@ class GameRound(Base):
 
 class Prediction(Base):
     __tablename__ = "predictions"
+    __table_args__ = (
+        UniqueConstraint("user_uid", "game_round_id", name="uq_predictions_user_round"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_uid: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.uid"), nullable=False)
     game_round_id: Mapped[int] = mapped_column(
-        ForeignKey("game_rounds.id"), nullable=False
+        ForeignKey("game_rounds.id"), nullable=False, index=True
     )
     choice: Mapped[PredictionChoice] = mapped_column(Integer, nullable=False)
     is_won: Mapped[bool | None] = mapped_column(Boolean, default=None)
@@ -78,3 +105,17 @@ class Prediction(Base):
     # リレーションシップ
     game_round: Mapped["GameRound"] = relationship(back_populates="predictions")
     user: Mapped["User"] = relationship()
+
+
+# 取引所から取得したローソク足（確定済みのみ保存）
+class Candle(Base):
+    __tablename__ = "candles"
+
+    symbol: Mapped[str] = mapped_column(String(20), primary_key=True)
+    timeframe: Mapped[str] = mapped_column(String(10), primary_key=True)
+    timestamp: Mapped[int] = mapped_column(BigInteger, primary_key=True)  # ms
+    open: Mapped[float] = mapped_column(Float, nullable=False)
+    high: Mapped[float] = mapped_column(Float, nullable=False)
+    low: Mapped[float] = mapped_column(Float, nullable=False)
+    close: Mapped[float] = mapped_column(Float, nullable=False)
+    volume: Mapped[float] = mapped_column(Float, nullable=False)
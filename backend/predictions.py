@@ -0,0 +1,143 @@
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import metrics
+import models
+import schemas
+from broadcaster import broadcaster
+from fastapi import HTTPException
+from ranking import rank_index
+from round_cache import active_round_cache
+from settlement import STAKE
+from sqlalchemy import literal, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@dataclass
+class PredictionResult:
+    id: int
+    game_round_id: int
+    choice: models.PredictionChoice
+    user_uid: uuid.UUID
+    user: schemas.UserMini
+    is_new: bool
+    points_before: int
+
+
+async def upsert_prediction(
+    db: AsyncSession,
+    game_round_id: int,
+    user_uid: uuid.UUID,
+    choice: models.PredictionChoice,
+) -> PredictionResult:
+    """
+    予想の登録・変更と参加ポイントの引き落としを2文で行う（commitは呼び出し側）
+    1. 締切前のラウンドに対してINSERT、登録済みならchoiceのみUPDATE
+    2. 新規登録時のみ、残高が足りる場合に限りポイントを引き落とす
+    """
+    now = datetime.now(timezone.utc)
+
+    # 締切前のラウンドが存在する場合のみ行が生成される
+    source = select(
+        literal(user_uid, models.Prediction.user_uid.type),
+        models.GameRound.id,
+        literal(int(choice), models.Prediction.choice.type),
+        literal(0),
+    ).where(models.GameRound.id == game_round_id, models.GameRound.closed_at > now)
+
+    stmt = insert(models.Prediction).from_select(
+        ["user_uid", "game_round_id", "choice", "earned_points"], source
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_predictions_user_round",
+        set_={"choice": stmt.excluded.choice, "updated_at": now},
+    ).returning(
+        models.Prediction.id,
+        # xmax = 0 なら新規INSERT（UPDATEされた行は更新トランザクションのIDを持つ）
+        literal_column("(xmax = 0)").label("inserted"),
+    )
+
+    try:
+        row = (await db.execute(stmt)).first()
+    except IntegrityError:
+        # 外部キー違反（ユーザー未存在）
+        raise HTTPException(status_code=404, detail="ユーザーが存在しません")
+
+    if row is None:
+        stmt = select(models.GameRound.id).where(models.GameRound.id == game_round_id)
+        if await db.scalar(stmt) is None:
+            raise HTTPException(
+                status_code=404, detail="指定されたゲームラウンドは存在しません"
+            )
+        raise HTTPException(
+            status_code=400, detail="このラウンドはすでに締め切られています"
+        )
+
+    stake = STAKE if row.inserted else 0
+    stmt = (
+        update(models.User)
+        .where(models.User.uid == user_uid, models.User.points >= stake)
+        .values(
+            points=models.User.points - stake,
+            total_rounds=models.User.total_rounds + (1 if row.inserted else 0),
+        )
+        .returning(models.User.name, models.User.is_ai, models.User.points)
+    )
+    user = (
+        await db.execute(stmt, execution_options={"synchronize_session": False})
+    ).first()
+
+    if user is None:
+        # ポイントが不足している場合は参加不可
+        raise HTTPException(status_code=400, detail="ポイントが不足しています")
+
+    return PredictionResult(
+        id=row.id,
+        game_round_id=game_round_id,
+        choice=models.PredictionChoice(choice),
+        user_uid=user_uid,
+        user=schemas.UserMini.model_validate(user),
+        is_new=row.inserted,
+        points_before=user.points + stake,
+    )
+
+
+async def upsert_predictions(
+    db: AsyncSession,
+    items: list[tuple[int, uuid.UUID, models.PredictionChoice]],
+) -> list[PredictionResult | HTTPException]:
+    """
+    複数の予想を1トランザクション内で登録する（commitは呼び出し側）
+    各件はセーブポイントで区切り、失敗した件だけを取り消す
+    """
+    results = []
+    for game_round_id, user_uid, choice in items:
+        try:
+            async with db.begin_nested():
+                result = await upsert_prediction(db, game_round_id, user_uid, choice)
+            results.append(result)
+        except HTTPException as e:
+            results.append(e)
+    return results
+
+
+def on_committed(result: PredictionResult):
+    """commit後に順位インデックス・キャッシュ・購読者・メトリクスへ反映する"""
+    metrics.PREDICTIONS.labels("new" if result.is_new else "changed").inc()
+
+    if result.user.points != result.points_before:
+        rank_index.move(result.user_uid, result.user.points)
+
+    active_round_cache.invalidate()
+    broadcaster.publish(
+        result.game_round_id,
+        "prediction",
+        {
+            "user": result.user.model_dump(),
+            "choice": result.choice,
+            "is_new": result.is_new,
+        },
+    )
@@ -0,0 +1,73 @@
+import time
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_ms: float = 0.0
+
+
+# リクエスト単位の集計（リクエスト外で実行されたSQLは集計しない）
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+# SQL1回毎の実行時間（秒）を受け取る関数（Prometheus のヒストグラムなど）
+_observers: list[Callable[[float], None]] = []
+
+
+def install(engine: Engine, observe: Callable[[float], None] | None = None):
+    """
+    エンジンにSQL実行回数・実行時間を計測するイベントを登録する
+    計測は1回だけ行い、リクエスト毎の集計と observe の両方に渡す
+    """
+    if observe is not None:
+        _observers.append(observe)
+    if not event.contains(engine, "before_cursor_execute", _before):
+        event.listen(engine, "before_cursor_execute", _before)
+        event.listen(engine, "after_cursor_execute", _after)
+        event.listen(engine, "handle_error", _error)
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    _finish(conn)
+
+
+def _error(context):
+    # 失敗したSQLでは after_cursor_execute が呼ばれないため、ここで取り除く
+    if context.connection is not None and context.connection.info.get("query_start"):
+        _finish(context.connection)
+
+
+def _finish(conn):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.total_ms += elapsed * 1000
+    for observe in _observers:
+        observe(elapsed)
+
+
+async def middleware(request: Request, call_next):
+    """レスポンスヘッダーにSQL実行回数・DB時間を付与する"""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+
+    response.headers["X-DB-Query-Count"] = str(stats.count)
+    response.headers["X-DB-Time-Ms"] = f"{stats.total_ms:.1f}"
+    response.headers["Server-Timing"] = f"db;dur={stats.total_ms:.1f}"
+    return response
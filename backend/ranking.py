@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right, insort
+
+import database
+import models
+from sqlalchemy import select
+
+# 他プロセスでの更新を取り込むため、一定時間で再構築する
+REBUILD_INTERVAL_SEC = 300
+
+
+def _remove(points: list[int], value: int):
+    i = bisect_left(points, value)
+    if i < len(points) and points[i] == value:
+        del points[i]
+
+
+class RankIndex:
+    """
+    全ユーザーのポイントを昇順リストで保持し、順位を二分探索で求める。
+    ラウンド確定時に再構築し、予想登録などの増減は差分で反映する。
+    """
+
+    def __init__(self):
+        self._points: list[int] = []
+        self._user_points: dict[uuid.UUID, int] = {}
+        self._built_at: float | None = None
+        # 破棄のたびに進める（再構築中の破棄を検出するため）
+        self._generation = 0
+        # 再構築中に反映した差分（ユーザー -> 反映後のポイント）
+        self._pending: dict[uuid.UUID, int] | None = None
+        self._rebuild_task: asyncio.Task | None = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+            self._generation += 1
+
+    async def rebuild(self):
+        with self._lock:
+            generation = self._generation
+            self._pending = {}
+        try:
+            async with database.open_session() as db:
+                stmt = select(models.User.uid, models.User.points)
+                rows = (await db.execute(stmt)).all()
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+
+        user_points = {uid: points for uid, points in rows}
+        points = sorted(user_points.values())
+        with self._lock:
+            # 読み取り中に反映された差分を再適用する
+            # （ユーザー毎に値を上書きするため、読み取り前の更新でも二重にならない）
+            for uid, new in self._pending.items():
+                old = user_points.get(uid)
+                if old is not None:
+                    _remove(points, old)
+                insort(points, new)
+                user_points[uid] = new
+            self._pending = None
+
+            self._points = points
+            self._user_points = user_points
+            # 読み取り中に破棄された場合（ラウンド確定など）は暫定とし、次回も再構築する
+            if self._generation == generation:
+                self._built_at = time.monotonic()
+
+    async def ensure(self):
+        """
+        古ければ再構築する
+        同時に呼ばれた場合は実行中の再構築を待ち、SELECTは1回だけ行う
+        """
+        built_at = self._built_at
+        if built_at is not None and time.monotonic() - built_at <= REBUILD_INTERVAL_SEC:
+            return
+
+        if self._rebuild_task is None:
+            self._rebuild_task = asyncio.create_task(self.rebuild())
+            self._rebuild_task.add_done_callback(self._rebuild_done)
+        # 待っているリクエストが切断されても、再構築は他の待機者のために続ける
+        await asyncio.shield(self._rebuild_task)
+
+    def _rebuild_done(self, task: asyncio.Task):
+        self._rebuild_task = None
+        if not task.cancelled() and task.exception() is not None:
+            print(f"順位インデックスの再構築失敗: {task.exception()}")
+
+    def add(self, uid: uuid.UUID, points: int):
+        self.move(uid, points)
+
+    def move(self, uid: uuid.UUID, new: int):
+        with self._lock:
+            if self._pending is not None:
+                self._pending[uid] = new
+            old = self._user_points.get(uid)
+            if old is not None:
+                _remove(self._points, old)
+            insort(self._points, new)
+            self._user_points[uid] = new
+
+    def rank(self, points: int) -> int:
+        # 自分より多いポイントのユーザー数 + 1
+        with self._lock:
+            return len(self._points) - bisect_right(self._points, points) + 1
+
+    def percentile(self, points: int) -> float:
+        # 自分以下のポイントのユーザーの割合（上位ほど100に近い）
+        with self._lock:
+            if not self._points:
+                return 0.0
+            return bisect_right(self._points, points) / len(self._points) * 100
+
+
+rank_index = RankIndex()
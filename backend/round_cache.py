@@ -0,0 +1,58 @@
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from config import settings
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    expires_at: float  # time.monotonic() 基準
+
+
+class ActiveRoundCache:
+    """
+    /game_rounds/active のシリアライズ済みレスポンスを保持する。
+    予想登録・ラウンド作成・確定時に破棄し、締切時刻またはTTL経過で失効する。
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entry: CachedResponse | None = None
+        # invalidate() のたびに進める（取得中に破棄された内容を保持しないため）
+        self.version = 0
+
+    def get(self) -> CachedResponse | None:
+        entry = self._entry
+        if entry is None or time.monotonic() >= entry.expires_at:
+            return None
+        return entry
+
+    def set(
+        self, body: bytes, closed_at: datetime | None, version: int
+    ) -> CachedResponse:
+        """
+        version は取得前に読んだ self.version。
+        取得中に破棄されていれば古い内容の可能性があるため、返すだけで保持しない
+        """
+        expires_at = time.monotonic() + self.ttl
+        if closed_at is not None:
+            # 締切を過ぎたらアクティブラウンドが変わるため失効させる
+            until_closed = closed_at.timestamp() - time.time()
+            expires_at = min(expires_at, time.monotonic() + until_closed)
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        entry = CachedResponse(body=body, etag=etag, expires_at=expires_at)
+        if version == self.version:
+            self._entry = entry
+        return entry
+
+    def invalidate(self):
+        self._entry = None
+        self.version += 1
+
+
+active_round_cache = ActiveRoundCache(ttl=settings.active_round_cache_ttl)
@@ -2,7 +2,7 @@ from datetime import datetime
 from uuid import UUID
 
 from models import ChartData, PredictionChoice
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, computed_field
 
 
 class ResponseBase(BaseModel):
@@ -38,6 +38,14 @@ class UserLookup(BaseModel):
     uid: UUID
 
 
+# [timestamp, open, high, low, close, volume]
+Ohlcv = tuple[int, float, float, float, float, float]
+
+
+# /game_rounds/{id}/chart のレスポンス（圧縮形式のチャート）
+ChartResponse = ChartData
+
+
 class GameRoundCreateResponse(ResponseBase):
     id: int
     start_at: datetime
@@ -46,7 +54,7 @@ class GameRoundCreateResponse(ResponseBase):
     base_price: float
 
 
-class prediction(BaseModel):
+class prediction(ResponseBase):
     user: UserMini
     choice: PredictionChoice
 
@@ -60,7 +68,27 @@ class GameRoundResponse(ResponseBase):
     result_price: float | None
     winning_choice: PredictionChoice | None
     predictions: list[prediction]
-    chart_data: ChartData
+
+    @computed_field
+    @property
+    def chart_url(self) -> str:
+        return f"/game_rounds/{self.id}/chart"
+
+
+# 一覧表示用（チャート・参加者を含まない軽量版）
+class GameRoundSummary(ResponseBase):
+    id: int
+    start_at: datetime
+    closed_at: datetime
+    target_at: datetime
+    base_price: float
+    result_price: float | None
+    winning_choice: PredictionChoice | None
+
+
+class GameRoundPage(BaseModel):
+    items: list[GameRoundSummary]
+    next_cursor: int | None
 
 
 class PredictionCreate(BaseModel):
@@ -75,6 +103,17 @@ class PredictionCreateResponse(ResponseBase):
     user: UserMini
 
 
+class PredictionBatchCreate(BaseModel):
+    items: list[PredictionCreate] = Field(max_length=1000)
+
+
+class PredictionBatchItemResult(BaseModel):
+    user_uid: UUID
+    status_code: int
+    detail: str | None = None
+    prediction: PredictionCreateResponse | None = None
+
+
 class LeaderBoardItem(ResponseBase):
     rank: int
     username: str
@@ -82,3 +121,9 @@ class LeaderBoardItem(ResponseBase):
     total_rounds: int
     wins: int
     win_rate: float
+
+
+class LeaderBoardMe(LeaderBoardItem):
+    percentile: float
+    above: LeaderBoardItem | None
+    below: LeaderBoardItem | None
@@ -0,0 +1,134 @@
+import charts
+import models
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+STAKE = 100  # 参加1回あたりのポイント
+BONUS = 2  # プール倍率
+
+
+def judge_winning_choice(base_price: float, result_price: float):
+    diff_pct = (result_price - base_price) / base_price
+    if diff_pct <= -0.003:
+        return models.PredictionChoice.BEARISH
+    elif diff_pct >= 0.003:
+        return models.PredictionChoice.BULLISH
+    else:
+        return models.PredictionChoice.NEUTRAL
+
+
+def calc_share(num_participants: int, num_winners: int) -> int:
+    """勝者1人あたりの獲得ポイント（参加人数 * 100pt * 2 を勝者で等分）"""
+    if num_winners == 0:
+        return 0
+    total_pool = num_participants * STAKE * BONUS
+    return total_pool // num_winners
+
+
+def _set_result(
+    round: models.GameRound,
+    result_price: float,
+    chart_data_after: list[models.PriceAtTime],
+):
+    # ゲームラウンドに正解をセットする
+    round.result_price = result_price
+
+    # チャートデータを追加する
+    round.chart_data = charts.with_after(round.chart_data, chart_data_after)
+
+    round.winning_choice = judge_winning_choice(round.base_price, result_price)
+
+
+async def settle_round(
+    db: AsyncSession,
+    round: models.GameRound,
+    result_price: float,
+    chart_data_after: list[models.PriceAtTime],
+):
+    """
+    1つのラウンドに対して、勝敗判定とポイント分配を行う
+    （round.predictions がロード済みであること）
+    """
+    _set_result(round, result_price, chart_data_after)
+
+    # ポイント計算・配布
+    win_predictions = [p for p in round.predictions if p.choice == round.winning_choice]
+    share = calc_share(len(round.predictions), len(win_predictions))
+
+    # 予想データのポイントを更新
+    for p in round.predictions:
+        if p.choice == round.winning_choice:
+            p.is_won = True
+            p.earned_points = share
+        else:
+            p.is_won = False
+
+    if win_predictions:
+        await _credit_winners(db, round, share)
+
+
+async def _credit_winners(db: AsyncSession, round: models.GameRound, share: int):
+    """
+    勝者の所持ポイント・勝利数を加算する
+    判定中に登録された予想の参加ポイントの支払いを上書きしないよう、
+    読み込んだ値ではなく現在の値への加算としてUPDATEする
+    """
+    winners = (
+        select(models.Prediction.user_uid)
+        .where(models.Prediction.game_round_id == round.id)
+        .where(models.Prediction.choice == round.winning_choice)
+    )
+    stmt = (
+        update(models.User)
+        .where(models.User.uid.in_(winners))
+        .values(points=models.User.points + share, wins=models.User.wins + 1)
+    )
+    await db.execute(stmt, execution_options={"synchronize_session": False})
+
+
+async def settle_round_bulk(
+    db: AsyncSession,
+    round: models.GameRound,
+    result_price: float,
+    chart_data_after: list[models.PriceAtTime],
+):
+    """
+    settle_round と同じ分配を、予想・ユーザーをロードせずUPDATE文で行う。
+    参加者が多いラウンド向け。
+    """
+    _set_result(round, result_price, chart_data_after)
+    winning_choice = round.winning_choice
+
+    # 参加者数・勝者数
+    stmt = select(
+        func.count(models.Prediction.id),
+        func.count(models.Prediction.id).filter(
+            models.Prediction.choice == winning_choice
+        ),
+    ).where(models.Prediction.game_round_id == round.id)
+    num_participants, num_winners = (await db.execute(stmt)).one()
+
+    if num_participants == 0:
+        return
+
+    share = calc_share(num_participants, num_winners)
+    is_winner = models.Prediction.choice == winning_choice
+
+    # 予想データの勝敗・獲得ポイント
+    stmt = (
+        update(models.Prediction)
+        .where(models.Prediction.game_round_id == round.id)
+        .values(
+            is_won=is_winner,
+            earned_points=case(
+                (is_winner, share), else_=models.Prediction.earned_points
+            ),
+        )
+    )
+    await db.execute(stmt, execution_options={"synchronize_session": False})
+
+    if num_winners == 0:
+        return
+
+    # 勝者の所持ポイント・勝利数
+    await _credit_winners(db, round, share)
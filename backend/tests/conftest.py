@@ -0,0 +1,9 @@
+import os
+import sys
+
+# アプリのモジュールは backend 直下からの import を前提としている
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py は import 時にエンジンを作るため、接続先が未設定でも読み込めるようにする
+# （接続はしない。テストでは各テストで作る SQLite のエンジンを使う）
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/kasou_test")
@@ -0,0 +1,111 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+import ranking
+from ranking import RankIndex
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeDB:
+    """SELECT の回数を数え、started/release で読み取り中の割り込みを再現する"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.selects = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def execute(self, stmt):
+        self.selects += 1
+        self.started.set()
+        await self.release.wait()
+        return FakeResult(list(self.rows.items()))
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    holder = {}
+
+    @asynccontextmanager
+    async def open_session():
+        yield holder["db"]
+
+    monkeypatch.setattr(ranking.database, "open_session", open_session)
+
+    def install(rows):
+        holder["db"] = FakeDB(rows)
+        return holder["db"]
+
+    return install
+
+
+def users(*points):
+    return {uuid.uuid4(): p for p in points}
+
+
+def test_concurrent_ensure_runs_one_select(fake_db):
+    db = fake_db(users(100, 200, 300))
+    index = RankIndex()
+
+    async def main():
+        waiters = [asyncio.create_task(index.ensure()) for _ in range(10)]
+        await db.started.wait()
+        db.release.set()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(main())
+
+    assert db.selects == 1
+    assert index.rank(200) == 2
+
+
+@pytest.mark.parametrize("committed_before_select", [False, True])
+def test_moves_during_rebuild_are_replayed(fake_db, committed_before_select):
+    rows = users(100, 200, 300)
+    uid = next(iter(rows))
+    db = fake_db(dict(rows))
+    if committed_before_select:
+        # 読み取り結果に反映済みの更新でも二重に数えない
+        db.rows[uid] = 500
+    index = RankIndex()
+
+    async def main():
+        task = asyncio.create_task(index.ensure())
+        await db.started.wait()
+        index.move(uid, 500)
+        db.release.set()
+        await task
+
+    asyncio.run(main())
+
+    assert index.rank(500) == 1
+    assert index.rank(100) == 4
+    assert index.percentile(500) == 100
+    # 差分の反映では最新とみなせなくならない
+    assert index._built_at is not None
+
+
+def test_invalidate_during_rebuild_leaves_index_stale(fake_db):
+    db = fake_db(users(100, 200))
+    index = RankIndex()
+
+    async def main():
+        task = asyncio.create_task(index.ensure())
+        await db.started.wait()
+        index.invalidate()
+        db.release.set()
+        await task
+
+    asyncio.run(main())
+
+    assert index.rank(100) == 2
+    assert index._built_at is None
@@ -0,0 +1,213 @@
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import charts
+import models
+import pytest
+import settlement
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+
+BASE_PRICE = 100.0
+HOUR = timedelta(hours=1)
+
+# 判定結果ごとの result_price（±0.3%の帯の外側・内側）
+RESULT_PRICES = {
+    models.PredictionChoice.BEARISH: 99.5,
+    models.PredictionChoice.NEUTRAL: 100.1,
+    models.PredictionChoice.BULLISH: 100.5,
+}
+
+ALL_CHOICES = list(models.PredictionChoice)
+
+
+def make_dataset(seed, rounds):
+    """
+    同じデータを2つのDBに投入するための行を作る
+    rounds は (正解, 参加者の選択肢の候補, 参加人数) のリスト
+    """
+    rng = random.Random(seed)
+    users = [
+        {
+            "uid": uuid.UUID(int=rng.getrandbits(128)),
+            "name": f"user{i}",
+            "points": rng.randint(0, 5000),
+            "total_rounds": rng.randint(0, 50),
+            "wins": rng.randint(0, 10),
+        }
+        for i in range(40)
+    ]
+
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    game_rounds = []
+    predictions = []
+    for i, (winning_choice, choices, participants) in enumerate(rounds):
+        start_at = start + HOUR * i
+        game_rounds.append(
+            {
+                "id": i + 1,
+                "start_at": start_at,
+                "closed_at": start_at + HOUR,
+                "target_at": start_at + HOUR * 4,
+                "base_price": BASE_PRICE,
+                "result_price_to_settle": RESULT_PRICES[winning_choice],
+            }
+        )
+        for user in rng.sample(users, participants):
+            predictions.append(
+                {
+                    "user_uid": user["uid"],
+                    "game_round_id": i + 1,
+                    "choice": rng.choice(choices),
+                }
+            )
+
+    return users, game_rounds, predictions
+
+
+async def settle(tmp_path, name, dataset, mode, before_settle=None):
+    """
+    データを投入し、全ラウンドを1トランザクションで確定した後の状態を返す
+    before_settle はラウンドの読み込み後・確定前に別セッションで実行する
+    """
+    users, game_rounds, predictions = dataset
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with Session() as db:
+        db.add_all(models.User(**user) for user in users)
+        db.add_all(
+            models.GameRound(
+                **{k: v for k, v in r.items() if k != "result_price_to_settle"},
+                chart_data=charts.encode([], []),
+            )
+            for r in game_rounds
+        )
+        db.add_all(models.Prediction(**p) for p in predictions)
+        await db.commit()
+
+    async with Session() as db:
+        stmt = select(models.GameRound).order_by(models.GameRound.id)
+        if mode == "orm":
+            stmt = stmt.options(selectinload(models.GameRound.predictions))
+        rounds = (await db.scalars(stmt)).all()
+
+        if before_settle is not None:
+            await before_settle(Session)
+
+        for round, r in zip(rounds, game_rounds):
+            result_price = r["result_price_to_settle"]
+            target = int(r["target_at"].timestamp() * 1000)
+            chart_data_after = [(target, result_price)]
+            if mode == "orm":
+                await settlement.settle_round(db, round, result_price, chart_data_after)
+            else:
+                await settlement.settle_round_bulk(
+                    db, round, result_price, chart_data_after
+                )
+        await db.commit()
+
+    async with Session() as db:
+        users_after = {
+            u.uid: (u.points, u.total_rounds, u.wins)
+            for u in await db.scalars(select(models.User))
+        }
+        predictions_after = {
+            (p.user_uid, p.game_round_id): (p.is_won, p.earned_points)
+            for p in await db.scalars(select(models.Prediction))
+        }
+        rounds_after = {
+            r.id: (r.result_price, r.winning_choice, r.chart_data)
+            for r in await db.scalars(select(models.GameRound))
+        }
+
+    await engine.dispose()
+    return users_after, predictions_after, rounds_after
+
+
+def settle_both(tmp_path, dataset):
+    orm = asyncio.run(settle(tmp_path, "orm", dataset, "orm"))
+    bulk = asyncio.run(settle(tmp_path, "bulk", dataset, "bulk"))
+    return orm, bulk
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bulk_matches_orm_on_random_rounds(tmp_path, seed):
+    rng = random.Random(seed)
+    rounds = [
+        (rng.choice(ALL_CHOICES), ALL_CHOICES, rng.randint(1, 40)) for _ in range(6)
+    ]
+    dataset = make_dataset(seed, rounds)
+
+    orm, bulk = settle_both(tmp_path, dataset)
+
+    assert bulk == orm
+
+
+def test_bulk_matches_orm_without_winners(tmp_path):
+    bullish = models.PredictionChoice.BULLISH
+    others = [models.PredictionChoice.BEARISH, models.PredictionChoice.NEUTRAL]
+    dataset = make_dataset(100, [(bullish, others, 30), (bullish, others, 1)])
+
+    orm, bulk = settle_both(tmp_path, dataset)
+
+    assert bulk == orm
+    users, predictions, _ = orm
+    assert all(is_won is False for is_won, _ in predictions.values())
+    assert all(earned == 0 for _, earned in predictions.values())
+    # 勝者がいなければ誰のポイント・勝利数も変わらない
+    before = {u["uid"]: (u["points"], u["total_rounds"], u["wins"]) for u in dataset[0]}
+    assert users == before
+
+
+def test_bulk_matches_orm_when_everyone_wins(tmp_path):
+    bearish = models.PredictionChoice.BEARISH
+    dataset = make_dataset(200, [(bearish, [bearish], 25), (bearish, [bearish], 40)])
+
+    orm, bulk = settle_both(tmp_path, dataset)
+
+    assert bulk == orm
+    _, predictions, _ = orm
+    # 全員が勝者なら、それぞれ参加ポイントの2倍を得る
+    stake_back = settlement.STAKE * settlement.BONUS
+    assert all(p == (True, stake_back) for p in predictions.values())
+
+
+def test_bulk_matches_orm_on_round_without_participants(tmp_path):
+    neutral = models.PredictionChoice.NEUTRAL
+    dataset = make_dataset(300, [(neutral, ALL_CHOICES, 0), (neutral, ALL_CHOICES, 5)])
+
+    orm, bulk = settle_both(tmp_path, dataset)
+
+    assert bulk == orm
+    _, _, rounds = orm
+    assert rounds[1][1] == neutral
+
+
+@pytest.mark.parametrize("mode", ["orm", "bulk"])
+def test_settlement_keeps_stake_paid_during_settlement(tmp_path, mode):
+    bullish = models.PredictionChoice.BULLISH
+    dataset = make_dataset(400, [(bullish, [bullish], 3)])
+    users, _, predictions = dataset
+    winner = predictions[0]["user_uid"]
+    points = next(u["points"] for u in users if u["uid"] == winner)
+
+    async def pay_stake(Session):
+        # 判定中に次のラウンドへ参加した（参加ポイントの支払い）
+        async with Session() as db:
+            user = await db.get(models.User, winner)
+            user.points = models.User.points - settlement.STAKE
+            await db.commit()
+
+    users_after, _, _ = asyncio.run(
+        settle(tmp_path, mode, dataset, mode, before_settle=pay_stake)
+    )
+
+    share = settlement.calc_share(3, 3)
+    assert users_after[winner][0] == points - settlement.STAKE + share
@@ -1,6 +1,13 @@
 import { useEffect, useState } from "react";
-import type { GameRound, GameRoundRaw } from "../types";
+import type {
+  ChartEncoded,
+  GameRound,
+  GameRoundRaw,
+  PredictionEvent,
+  SettledEvent,
+} from "../types";
 import axios from "axios";
+import { decodeChart } from "../utils/chart";
 
 export const useGameRound = (id: string) => {
   const [gameRound, setGameRound] = useState<GameRound | null>(null);
@@ -13,12 +20,15 @@ export const useGameRound = (id: string) => {
       const response = await axios.get<GameRoundRaw>(
         `${apiUrl}/game_rounds/${id}`,
       );
-      const raw = response.data;
+      const { chart_url, ...raw } = response.data;
+      // 確定済みラウンドのチャートはブラウザにキャッシュされる
+      const chart = await axios.get<ChartEncoded>(`${apiUrl}${chart_url}`);
       const formattedGameRound: GameRound = {
         ...raw,
         start_at: new Date(raw.start_at),
         closed_at: new Date(raw.closed_at),
         target_at: new Date(raw.target_at),
+        chart_data: decodeChart(chart.data),
       };
       setGameRound(formattedGameRound);
     } catch (error) {
@@ -34,6 +44,53 @@ export const useGameRound = (id: string) => {
     fetchGameRound();
   }, [id]);
 
+  // 確定前のラウンドはサーバーからの更新イベントを受け取って反映する
+  const roundId = gameRound?.id;
+  const isSettled = gameRound?.winning_choice != null;
+
+  useEffect(() => {
+    if (!roundId || isSettled) return;
+
+    const apiUrl = import.meta.env.VITE_API_URL;
+    const source = new EventSource(`${apiUrl}/game_rounds/${roundId}/events`);
+
+    source.addEventListener("prediction", (e) => {
+      const event: PredictionEvent = JSON.parse(e.data);
+      setGameRound((prev) => {
+        if (!prev) return prev;
+        const others = prev.predictions.filter(
+          (pred) => pred.user.name !== event.user.name,
+        );
+        return {
+          ...prev,
+          predictions: [...others, { user: event.user, choice: event.choice }],
+        };
+      });
+    });
+
+    // 締切時に再描画させる
+    source.addEventListener("closed", () => {
+      setGameRound((prev) => (prev ? { ...prev } : prev));
+    });
+
+    source.addEventListener("settled", (e) => {
+      const event: SettledEvent = JSON.parse(e.data);
+      setGameRound((prev) =>
+        prev
+          ? {
+              ...prev,
+              result_price: event.result_price,
+              winning_choice: event.winning_choice,
+              chart_data: decodeChart(event.chart),
+            }
+          : prev,
+      );
+      source.close();
+    });
+
+    return () => source.close();
+  }, [roundId, isSettled]);
+
   return {
     gameRound,
     setGameRound,
@@ -12,11 +12,11 @@ const LeaderBoardPage: React.FC = () => {
   const [userStats, setUserStats] = useState<UserStats | null>(null);
   const [leaderBoard, setLeaderBoard] = useState<LeaderBoard[]>([]);
 
-  const fetchUserStats = async (username: string) => {
+  const fetchUserStats = async (uid: string) => {
     try {
       const apiUrl = import.meta.env.VITE_API_URL;
       const response = await axios.get<UserStats>(
-        `${apiUrl}/leaderboard/me?username=${username}`,
+        `${apiUrl}/leaderboard/me?uid=${uid}`,
       );
       setUserStats(response.data);
     } catch (error) {
@@ -39,8 +39,9 @@ const LeaderBoardPage: React.FC = () => {
   }, []);
 
   useEffect(() => {
-    if (!user?.name) return;
-    fetchUserStats(user.name);
+    const savedUid = localStorage.getItem("uid");
+    if (!user || !savedUid) return;
+    fetchUserStats(savedUid);
   }, [user]);
 
   const rank = userStats?.rank ?? "-";
@@ -31,7 +31,17 @@ export interface GameRoundRaw {
   result_price: number | null;
   winning_choice: Choice | null;
   predictions: Prediction[];
-  chart_data: ChartRawData;
+  chart_url: string;
+}
+
+// サーバーから届くチャートの圧縮形式（utils/chart.ts の decodeChart で戻す）
+export interface ChartEncoded {
+  start: number;
+  step: number;
+  scale: number;
+  prices: number[];
+  before: number;
+  offsets?: number[];
 }
 
 export type ChartRawData = {
@@ -51,6 +61,19 @@ export interface GameRound {
   chart_data: ChartRawData;
 }
 
+export interface PredictionEvent {
+  user: UserMini;
+  choice: Choice;
+  is_new: boolean;
+}
+
+export interface SettledEvent {
+  id: number;
+  result_price: number;
+  winning_choice: Choice;
+  chart: ChartEncoded;
+}
+
 export interface PredictionCreateResponse {
   id: number;
   game_round_id: number;
@@ -65,6 +88,9 @@ export interface UserStats {
   total_rounds: number;
   wins: number;
   win_rate: number;
+  percentile: number;
+  above: LeaderBoard | null;
+  below: LeaderBoard | null;
 }
 
 export interface LeaderBoard {
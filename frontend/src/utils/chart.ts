@@ -0,0 +1,16 @@
+import type { ChartEncoded, ChartRawData } from "../types";
+
+// サーバーの圧縮形式（backend/charts.py）を (timestamp, price) の列に戻す
+export const decodeChart = (chart: ChartEncoded): ChartRawData => {
+  const points: [number, number][] = [];
+  let value = 0;
+  chart.prices.forEach((delta, i) => {
+    value += delta;
+    const offset = chart.offsets ? chart.offsets[i] : i;
+    points.push([chart.start + chart.step * offset, value / chart.scale]);
+  });
+  return {
+    before: points.slice(0, chart.before),
+    after: points.slice(chart.before),
+  };
+};